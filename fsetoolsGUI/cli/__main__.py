@@ -2,17 +2,43 @@
 Usage:
     fsetoolsgui
     fsetoolsgui -m=<module_id>
+    fsetoolsgui safir-batch <input_root_dir> --exe=<fp> [--timeout=<s>] [--n-proc=<n>] [--n-proc-max=<n>]
+                            [--post-process] [--threshold-strain=<v>] [--threshold-strain2=<v>] [--events=<fp>]
+                            [--scratch=<dir>] [--compress=<method>]
+    fsetoolsgui safir-bc <input_root_dir> (--template | --bc=<fp> [--reduction=<fp>])
 
 Options:
-    -m      Trigger a specific module
+    -m                        Trigger a specific module
+    --exe=<fp>                Safir executable file path.
+    --timeout=<s>             Seconds before a Safir job is killed [default: 1800].
+    --n-proc=<n>              Number of Safir processes, the minimum when `--n-proc-max` is provided [default: 2].
+    --n-proc-max=<n>          Adapt number of Safir processes to free memory and CPU load, up to this number.
+    --post-process            Extract strain of every completed job while others are still running.
+    --threshold-strain=<v>    Strain threshold of the post-processing exceedance summary.
+    --threshold-strain2=<v>   Stress related strain threshold of the post-processing exceedance summary.
+    --events=<fp>             Write JSON-lines progress events to this file, rather than stdout.
+    --scratch=<dir>           Run every job in a directory here, e.g. /dev/shm, and move outputs back when done.
+    --compress=<method>       Compress *.out files moved back from `--scratch`, gzip or zstd.
+    --template                Write bc_reduction_template.csv listing all directories containing *.in.
+    --bc=<fp>                 Boundary condition file to be copied to every directory containing *.in.
+    --reduction=<fp>          *.csv of reduction factors applied to the second column of `--bc`, by directory.
 
 Commands:
     fsetoolsgui
         `fsetoolsgui` graphical user interface.
+    fsetoolsgui safir-batch
+        Run all *.in files in <input_root_dir> with Safir without the graphical user interface. Jobs completed in a
+        previous run are skipped. Progress events (queued, started, finished, failed etc.) are written as JSON lines,
+        with elapsed time and ETA, summary is written to stderr. Exit code is 1 if any job failed.
+    fsetoolsgui safir-bc
+        Write a boundary condition file into every directory in <input_root_dir> containing *.in, optionally scaled
+        by directory. Unchanged files are not rewritten. Exit code is 1 if any directory has no reduction factor.
 """
 
 
+import json
 import os
+import sys
 
 from docopt import docopt
 
@@ -39,8 +65,59 @@ def gui():
     main_gui()
 
 
+def safir_batch(arguments: dict) -> int:
+    # imported here so that neither the batch runner is imported by the gui nor Qt by the batch runner
+    from fsetoolsGUI.etc.safir_pipeline import run_batch
+
+    def to_float(v):
+        return None if v is None else float(v)
+
+    f_events = sys.stdout if arguments['--events'] is None else open(arguments['--events'], 'a')
+    try:
+        summary = run_batch(
+            fp_safir_exe=arguments['--exe'],
+            fp_input_root_dir=arguments['<input_root_dir>'],
+            timeout=float(arguments['--timeout']),
+            n_proc=int(arguments['--n-proc']),
+            n_proc_max=None if arguments['--n-proc-max'] is None else int(arguments['--n-proc-max']),
+            is_post_process=arguments['--post-process'],
+            threshold_strain=to_float(arguments['--threshold-strain']),
+            threshold_strain2=to_float(arguments['--threshold-strain2']),
+            f_events=f_events,
+            dir_scratch=arguments['--scratch'],
+            compression=arguments['--compress'],
+        )
+    except KeyboardInterrupt:
+        return 130
+    except (ValueError, ModuleNotFoundError) as e:
+        sys.stderr.write(f'{e}\n')
+        return 1
+    finally:
+        if f_events is not sys.stdout:
+            f_events.close()
+    sys.stderr.write(json.dumps(summary) + '\n')
+    return 1 if summary['n_failed'] else 0
+
+
+def safir_bc(arguments: dict) -> int:
+    from fsetoolsGUI.etc.safir_bc import make_reduction_template, write_batch_bc
+
+    if arguments['--template']:
+        print(make_reduction_template(arguments['<input_root_dir>']))
+        return 0
+    try:
+        result = write_batch_bc(arguments['<input_root_dir>'], arguments['--bc'], arguments['--reduction'])
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f'{e}\n')
+        return 1
+    sys.stderr.write(json.dumps({k: len(v) for k, v in result.items()}) + '\n')
+    return 0
+
+
 def main():
     arguments = docopt(__doc__)
-    print(arguments)
-    if len(arguments) == 0:
-        gui()
+    if arguments['safir-batch']:
+        sys.exit(safir_batch(arguments))
+    if arguments['safir-bc']:
+        sys.exit(safir_bc(arguments))
+    gui()
@@ -0,0 +1,889 @@
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import psutil
+except ModuleNotFoundError:
+    psutil = None
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+logger = logging.getLogger('gui')
+
+MANIFEST_NAME = 'safir_batch_manifest.jsonl'
+
+# events of `run_jobs` and their info
+JOB_EVENTS = dict(
+    skipped='completed in a previous run',
+    queued='attempt, not_before, waiting to be started, again after a failed attempt or being shed',
+    started='attempt, pid',
+    finished='attempt, exit_code, duration, peak_rss, completed cleanly',
+    failed='attempt, state (failed or timeout), exit_code, duration, retry (whether to be queued again)',
+    cancelled='attempt, duration, killed as `run_jobs` stopped',
+)
+
+# suffix of archived *.out files of each compression, and compression level favouring speed
+COMPRESSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+COMPRESSION_LEVELS = dict(gzip=1, zstd=3)
+
+
+def make_job(fp_safir_exe: str, fp_in: str, timeout: float, fp_input_root_dir: str) -> dict:
+    """Make a job to run `fp_in` with Safir, `job_id` is the path of `fp_in` relative to `fp_input_root_dir`. A *.py
+    `fp_safir_exe`, e.g. `fsetoolsGUI.etc.safir_standin.write_standin_exe`, is run with the current Python
+    interpreter."""
+    root, file_ = os.path.split(fp_in)
+    name = file_[:-len('.in')]
+    return dict(
+        job_id=os.path.relpath(fp_in, fp_input_root_dir).replace(os.sep, '/'),
+        cmd=([sys.executable] if fp_safir_exe.endswith('.py') else []) + [fp_safir_exe, name],
+        cwd=root,
+        fp_in=fp_in,
+        fp_out=os.path.join(root, name + '.out'),
+        fp_stdout=os.path.join(root, name + '.stdout.txt'),
+        timeout_seconds=timeout,
+    )
+
+
+def make_jobs(fp_safir_exe: str, fp_input_root_dir: str, timeout: float) -> list:
+    """Make a job for every *.in file found in `fp_input_root_dir` and its sub-directories, see `make_job`."""
+    jobs = list()
+    for root, dirs, files in os.walk(fp_input_root_dir):
+        dirs.sort()
+        for file_ in sorted(files):
+            if file_.endswith('.in'):
+                jobs.append(make_job(fp_safir_exe, os.path.join(root, file_), timeout, fp_input_root_dir))
+    return jobs
+
+
+class Manifest:
+    """Append-only JSON-lines job manifest. Every state change of a job is appended as one line and flushed to disk, the
+    last line of a job is its current state, so the manifest survives the process being killed at any point."""
+
+    def __init__(self, fp: str):
+        self.fp = fp
+
+    def load(self) -> dict:
+        """:return: dict of {job_id: last record}, a partially written last line is ignored."""
+        return {record['job_id']: record for record in self.history()}
+
+    def history(self):
+        """Yield all records in the order they were appended, partially written lines are ignored."""
+        if not os.path.isfile(self.fp):
+            return
+        with open(self.fp, 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def peak_rss(self) -> dict:
+        """:return: dict of {job_id: the highest peak RSS in bytes recorded in any run of the job}."""
+        peak_rss = dict()
+        for record in self.history():
+            if record.get('peak_rss'):
+                peak_rss[record['job_id']] = max(peak_rss.get(record['job_id'], 0), record['peak_rss'])
+        return peak_rss
+
+    def append(self, job_id: str, **record):
+        record = dict(job_id=job_id, timestamp=time.time(), **record)
+        with open(self.fp, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return record
+
+
+_RP_IN_COUNT = re.compile(rb'^[ \t]*(NNODE|BEAM|SHELL|SOLID|TRUSS)[ \t]+([0-9]+)', re.MULTILINE)
+_RP_IN_TIME = re.compile(rb'^[ \t]*TIME[ \t]*\r?\n(.*?)^[ \t]*END_?TIME', re.MULTILINE | re.DOTALL)
+
+
+def read_in_features(fp_in: str) -> dict:
+    """Read features of a Safir *.in file which drive its run time.
+
+    :return:    dict of file `size` in bytes, `n_node` from NNODE, `n_element` the sum of BEAM, SHELL, SOLID and TRUSS
+                element counts and `n_time_step` from the TIME ... END_TIME block of (time step, end time) lines,
+                counts are 0 when not found.
+    """
+    with open(fp_in, 'rb') as f:
+        data = f.read()
+
+    counts = dict()
+    for k, v in _RP_IN_COUNT.findall(data):
+        counts.setdefault(k.decode(), int(v))
+
+    n_time_step, time_end = 0., 0.
+    m = _RP_IN_TIME.search(data)
+    for line in (m.group(1).splitlines() if m else []):
+        try:
+            step, end = (float(i) for i in line.split()[:2])
+        except ValueError:
+            continue
+        if step > 0 and end > time_end:
+            n_time_step += (end - time_end) / step
+            time_end = end
+
+    return dict(
+        size=len(data),
+        n_node=counts.get('NNODE', 0),
+        n_element=sum(counts.get(k, 0) for k in ('BEAM', 'SHELL', 'SOLID', 'TRUSS')),
+        n_time_step=int(round(n_time_step)),
+    )
+
+
+class DurationPredictor:
+    """Predict the wall time of a Safir job from its features, see `read_in_features`, by a least squares fit of log
+    duration over log features, with a small ridge penalty so that it is stable with few samples."""
+
+    FEATURES = ('size', 'n_node', 'n_element', 'n_time_step')
+
+    def __init__(self, min_samples: int = 2, ridge: float = 1e-2):
+        self.min_samples = min_samples
+        self.ridge = ridge
+        self.__samples = list()
+        self.__coef = None
+
+    def __design(self, features: list) -> np.ndarray:
+        return np.log1p(np.array([[i.get(k, 0) for k in self.FEATURES] for i in features], dtype=np.float64))
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.__coef is not None
+
+    def add(self, features: dict, duration: float):
+        if features is not None and duration and duration > 0:
+            self.__samples.append((features, duration))
+
+    def fit(self):
+        if len(self.__samples) < self.min_samples:
+            return self
+        x = self.__design([i[0] for i in self.__samples])
+        y = np.log([i[1] for i in self.__samples])
+        mean, std = x.mean(axis=0), x.std(axis=0)
+        std[std == 0] = 1.
+        x_ = (x - mean) / std
+        # ridge penalty on slopes only, the intercept is the mean log duration
+        w = np.linalg.solve(x_.T @ x_ + self.ridge * len(y) * np.eye(x_.shape[1]), x_.T @ (y - y.mean()))
+        self.__coef = (mean, std, w, y.mean())
+        return self
+
+    def predict(self, features: dict) -> float:
+        """:return: predicted duration in seconds, None if not fitted or `features` is None."""
+        if self.__coef is None or features is None:
+            return None
+        mean, std, w, intercept = self.__coef
+        return float(np.exp(((self.__design([features])[0] - mean) / std) @ w + intercept))
+
+    @classmethod
+    def from_manifest(cls, manifest, **kwargs):
+        """Make a predictor fitted to jobs completed cleanly in all runs recorded in `manifest`."""
+        predictor = cls(**kwargs)
+        for record in manifest.history():
+            if record.get('state') == 'completed' and record.get('exit_code') == 0:
+                predictor.add(record.get('features'), record.get('duration'))
+        return predictor.fit()
+
+
+class JsonLinesProgress:
+    """Write events of `run_jobs` to a text stream as JSON lines, one object per event with `event`, `job_id`, the
+    event info including `eta`, `elapsed` seconds since this object was made and number of finished jobs `n_finished`
+    of `n_total`. Skipped and finally failed jobs are counted as finished."""
+
+    def __init__(self, f=None):
+        self.f = sys.stdout if f is None else f
+        self.time_start = time.time()
+        self.__job_ids = set()
+        self.__n_finished = 0
+
+    def __call__(self, event: str, job: dict, **info):
+        self.__job_ids.add(job['job_id'])
+        if event in ('skipped', 'finished') or (event == 'failed' and not info.get('retry')):
+            self.__n_finished += 1
+
+        line = dict(event=event, job_id=job['job_id'], **info)
+        line.update(elapsed=time.time() - self.time_start, n_finished=self.__n_finished, n_total=len(self.__job_ids))
+        self.f.write(json.dumps(line) + '\n')
+        self.f.flush()
+
+
+def find_out(fp_out: str) -> str:
+    """:return: the most recent of `fp_out` and its archived versions, see `COMPRESSIONS`, None if none exists."""
+    fps = [fp_out + i for i in COMPRESSIONS.values() if os.path.isfile(fp_out + i)]
+    return max(fps, key=os.path.getmtime) if fps else None
+
+
+def is_job_done(job: dict, record: dict = None) -> bool:
+    """A job is done when its last manifest record completed cleanly and its *.out, or archived *.out, is newer than
+    its *.in."""
+    if record is None or record.get('state') != 'completed' or record.get('exit_code') != 0:
+        return False
+    fp_out = find_out(job['fp_out'])
+    try:
+        return fp_out is not None and os.path.getmtime(fp_out) >= os.path.getmtime(job['fp_in'])
+    except OSError:
+        return False
+
+
+def check_compression(compression: str = None):
+    """Check `compression` is one of `COMPRESSIONS` and can be used, so that a batch fails before any job is run.
+
+    :raises ValueError:             when `compression` is unknown.
+    :raises ModuleNotFoundError:    when the package of `compression` is not installed, `zstandard` for 'zstd'.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f'Unknown compression `{compression}`, one of {[i for i in COMPRESSIONS if i]}')
+    if compression == 'zstd' and zstandard is None:
+        raise ModuleNotFoundError('Package `zstandard` is required for zstd compression')
+
+
+def archive_file(fp_src: str, fp_dst: str, compression: str = None) -> str:
+    """Move `fp_src` to `fp_dst`, compressed when `compression` is 'gzip' or 'zstd' with the suffix of `COMPRESSIONS`
+    appended to `fp_dst`. The destination is written atomically and replaces other archived versions of it.
+
+    :return:    the destination file path.
+    """
+    check_compression(compression)
+    fp_dst_ = fp_dst + COMPRESSIONS[compression]
+    dir_dst = os.path.dirname(fp_dst_) or '.'
+    os.makedirs(dir_dst, exist_ok=True)
+    fd, fp_tmp = tempfile.mkstemp(dir=dir_dst, prefix=os.path.basename(fp_dst_), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f_dst, open(fp_src, 'rb') as f_src:
+            if compression == 'gzip':
+                with gzip.GzipFile(fileobj=f_dst, mode='wb', compresslevel=COMPRESSION_LEVELS['gzip']) as f_gz:
+                    shutil.copyfileobj(f_src, f_gz, 2 ** 20)
+            elif compression == 'zstd':
+                zstandard.ZstdCompressor(level=COMPRESSION_LEVELS['zstd']).copy_stream(f_src, f_dst)
+            else:
+                shutil.copyfileobj(f_src, f_dst, 2 ** 20)
+        shutil.copystat(fp_src, fp_tmp)
+        os.replace(fp_tmp, fp_dst_)
+    except BaseException:
+        os.remove(fp_tmp)
+        raise
+    os.remove(fp_src)
+
+    for suffix in COMPRESSIONS.values():
+        if fp_dst + suffix != fp_dst_ and os.path.isfile(fp_dst + suffix):
+            os.remove(fp_dst + suffix)
+    return fp_dst_
+
+
+def _is_output(file_name: str) -> bool:
+    return file_name.endswith(tuple(f'.out{i}' for i in COMPRESSIONS.values()) + ('.stdout.txt', '.tmp'))
+
+
+def stage_scratch(job: dict, dir_scratch: str) -> tuple:
+    """Copy input files of a job, all files in its directory except outputs, to a new directory in `dir_scratch`.
+
+    :return:    (scratch directory, dict of {file name: (size, modification time)} of the copied files).
+    """
+    dir_job = tempfile.mkdtemp(prefix=os.path.basename(job['cmd'][-1]) + '_', dir=dir_scratch)
+    snapshot = dict()
+    for entry in os.scandir(job['cwd']):
+        if entry.is_file() and not _is_output(entry.name):
+            fp = shutil.copy2(entry.path, os.path.join(dir_job, entry.name))
+            stat = os.stat(fp)
+            snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return dir_job, snapshot
+
+
+def collect_scratch(job: dict, dir_job: str, snapshot: dict, compression: str = None) -> list:
+    """Move files created or modified in a scratch directory made by `stage_scratch` back to the job directory, *.out
+    files are compressed when `compression` is provided, see `archive_file`. A file failing to be moved does not stop
+    the others, the scratch directory is removed in any case.
+
+    :return:    list of the collected file paths.
+    :raises OSError:    listing the files failed to be moved, once all others are moved.
+    """
+    collected, errors = list(), list()
+    try:
+        for root, dirs, files in os.walk(dir_job):
+            for file_ in files:
+                fp = os.path.join(root, file_)
+                rel = os.path.relpath(fp, dir_job)
+                try:
+                    stat = os.stat(fp)
+                    if snapshot.get(rel) == (stat.st_size, stat.st_mtime_ns):
+                        continue
+                    collected.append(archive_file(
+                        fp, os.path.join(job['cwd'], rel), compression if file_.endswith('.out') else None
+                    ))
+                except Exception as e:
+                    errors.append(f'{rel}, {e}')
+    finally:
+        shutil.rmtree(dir_job, ignore_errors=True)
+    if errors:
+        raise OSError(f'Failed to collect {len(errors)} file(s) from {dir_job}, {"; ".join(errors)}')
+    return collected
+
+
+def available_memory() -> int:
+    """Memory available to new processes in bytes without swapping, None if it can not be measured."""
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def load_average() -> float:
+    """1-minute system load average, None if it can not be measured."""
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        pass
+    if psutil is not None:
+        # on Windows, approximate load by the utilisation of all cores
+        return psutil.cpu_percent() / 100 * psutil.cpu_count()
+    return None
+
+
+def process_memory(pid: int):
+    """:return: (rss, peak rss) of a process in bytes, (None, None) if they can not be measured. The peak is read from
+                `/proc` on Linux, `peak_wset` of `psutil` on Windows, otherwise it is the current rss."""
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            status = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(status['VmRSS'].split()[0]) * 1024, int(status['VmHWM'].split()[0]) * 1024
+    except (OSError, KeyError, ValueError):
+        pass
+    if psutil is not None:
+        try:
+            info = psutil.Process(pid).memory_info()
+        except psutil.Error:
+            return None, None
+        return info.rss, getattr(info, 'peak_wset', info.rss)
+    return None, None
+
+
+class ConcurrencyController:
+    """Decide the number of concurrent Safir processes between `n_min` and `n_max` from free memory and load average.
+
+    A new process is started only when the memory expected to be taken by it and by the running processes that have not
+    yet reached their expected peak still leaves `memory_reserve` free, and when the load average leaves room for one
+    more process. The expected memory of a job is its peak RSS recorded in an earlier run, otherwise the largest peak
+    RSS seen in this batch. Starts are spaced by `ramp_interval` seconds once above `n_min`, so that the load average
+    and memory usage reflect the last start before the next decision. When free memory falls below half of
+    `memory_reserve`, the latest started process is to be shed, i.e. killed and requeued. When free memory or load can
+    not be measured, e.g. on Windows without `psutil`, no more than `n_min` processes are started.
+
+    :param memory_reserve:  memory in bytes to be kept free.
+    :param load_factor:     maximum load average per core.
+    """
+
+    def __init__(
+            self,
+            n_min: int = 1,
+            n_max: int = None,
+            memory_reserve: int = 2 ** 30,
+            load_factor: float = 1.,
+            ramp_interval: float = 5.,
+    ):
+        self.n_min = max(n_min, 1)
+        self.n_max = max(n_max or os.cpu_count() or 1, self.n_min)
+        self.memory_reserve = memory_reserve
+        self.load_factor = load_factor
+        self.ramp_interval = ramp_interval
+        self.__time_last_start = -float('inf')
+        self.__time_last_shed = -float('inf')
+        self.__peak_rss_max = 0
+        self.__is_unmeasured_warned = False
+
+    def observe(self, peak_rss: int):
+        """Record the peak RSS of a running or finished job."""
+        if peak_rss:
+            self.__peak_rss_max = max(self.__peak_rss_max, peak_rss)
+
+    def expected_rss(self, peak_rss: int = None) -> int:
+        return peak_rss or self.__peak_rss_max
+
+    def can_start(self, running: list, peak_rss: int = None, now: float = None) -> bool:
+        """
+        :param running: list of running tasks, each a dict with `rss` and `expected_rss` of the process.
+        :param peak_rss: recorded peak RSS of the job to be started, if known.
+        """
+        now = time.time() if now is None else now
+        n = len(running)
+        if n < self.n_min:
+            return True
+        if n >= self.n_max or now - self.__time_last_start < self.ramp_interval:
+            return False
+
+        memory, load = available_memory(), load_average()
+        if memory is None or load is None:
+            if not self.__is_unmeasured_warned:
+                self.__is_unmeasured_warned = True
+                logger.warning(
+                    f'Free memory or load average can not be measured, install `psutil`, '
+                    f'number of Safir processes is kept at {self.n_min}'
+                )
+            return False
+
+        committed = sum(max((i.get('expected_rss') or 0) - (i.get('rss') or 0), 0) for i in running)
+        if memory - committed - self.expected_rss(peak_rss) < self.memory_reserve:
+            return False
+
+        if load + 1 > self.load_factor * (os.cpu_count() or 1):
+            return False
+
+        return True
+
+    def started(self, now: float = None):
+        self.__time_last_start = time.time() if now is None else now
+
+    def should_shed(self, running: list, now: float = None) -> bool:
+        """Whether the latest started process should be killed and requeued, at most once per `ramp_interval`."""
+        now = time.time() if now is None else now
+        if len(running) <= self.n_min or now - self.__time_last_shed < self.ramp_interval:
+            return False
+        memory = available_memory()
+        if memory is not None and memory < self.memory_reserve / 2:
+            self.__time_last_shed = now
+            return True
+        return False
+
+
+def _start(job: dict, cwd: str = None) -> dict:
+    """Start a job in `cwd`, its own directory by default. Stdout is written in `cwd`, a scratch directory made by
+    `stage_scratch` is therefore the only directory written while the job runs, see `collect_scratch`."""
+    f_stdout = open(job['fp_stdout'] if cwd is None else os.path.join(cwd, os.path.basename(job['fp_stdout'])), 'w')
+    try:
+        proc = subprocess.Popen(job['cmd'], cwd=cwd or job['cwd'], stdout=f_stdout, stderr=subprocess.STDOUT)
+    except OSError:
+        f_stdout.close()
+        raise
+    return dict(proc=proc, f_stdout=f_stdout, time_start=time.time(), rss=None, peak_rss=None)
+
+
+def run_jobs(
+        jobs: list,
+        n_proc: int = 2,
+        dir_work: str = None,
+        controller: ConcurrencyController = None,
+        max_retries: int = 2,
+        backoff: float = 10.,
+        progress_callback=None,
+        event_callback=None,
+        stop_event=None,
+        dir_scratch: str = None,
+        compression: str = None,
+        longest_first: bool = True,
+        poll_interval: float = 0.2,
+) -> dict:
+    """Run jobs made by `make_jobs` with at most `n_proc` concurrent processes and record their state in a manifest.
+
+    Jobs completed cleanly in a previous run, see `is_job_done`, are skipped. Failed or timed-out jobs are retried up to
+    `max_retries` times, the n-th retry waits `backoff * 2 ** (n - 1)` seconds. A job running longer than its
+    `timeout_seconds` is killed.
+
+    Features of every job, see `read_in_features`, are recorded in the manifest with its duration. A
+    `DurationPredictor` fitted to all completed jobs in the manifest, and refitted as jobs complete, predicts the
+    duration of the others. It is used to estimate the time to finish all jobs, `eta`, and to order the queue.
+
+    :param dir_work:            directory of the manifest file, `MANIFEST_NAME`.
+    :param controller:          adapts the number of concurrent processes to free memory and load, `n_proc` is ignored
+                                when provided. The peak RSS of every job is recorded in the manifest and used as the
+                                expected memory of the job in later runs.
+    :param progress_callback:   called with (n_finished, n_total, eta) whenever a job finishes, skipped jobs are
+                                finished. `eta` is in seconds, None before any duration can be predicted.
+    :param event_callback:      called with (event, job, **info) on every state change of a job, see `JOB_EVENTS`,
+                                `info` includes `eta`.
+    :param stop_event:          `threading.Event`, running jobs are killed and the function returns once it is set.
+    :param dir_scratch:         when provided, every job runs in its own directory in `dir_scratch`, e.g. /dev/shm or
+                                a local SSD, see `stage_scratch`. Outputs are moved back to the job directory once the
+                                solver exits, in a background thread, and the job finishes after that.
+    :param compression:         'gzip' or 'zstd' to compress *.out files moved back from `dir_scratch`, see
+                                `archive_file`. Post processing reads compressed *.out files without decompressing
+                                them to disk.
+    :param longest_first:       start jobs predicted to take the longest first, which shortens the total time when
+                                jobs vary in size. Input file size is used before the predictor is fitted.
+    :return:                    dict of number of total, skipped, completed and failed jobs.
+    :raises ValueError, ModuleNotFoundError: when `compression` can not be used, see `check_compression`.
+    """
+    check_compression(compression)
+    manifest = Manifest(os.path.join(dir_work, MANIFEST_NAME))
+    records = manifest.load()
+    peak_rss_history = manifest.peak_rss()
+
+    predictor = DurationPredictor.from_manifest(manifest)
+    features, predicted = dict(), dict()
+    durations = list()
+
+    def predict():
+        predicted.clear()
+        if predictor.is_fitted:
+            predicted.update({k: predictor.predict(v) for k, v in features.items()})
+
+    def order():
+        # not in backoff first, then by predicted duration, or input file size, in descending order
+        if not longest_first:
+            return
+        now = time.time()
+        tasks = sorted(pending, key=lambda i: (
+            i['not_before'] > now,
+            -(predicted.get(i['job']['job_id']) or 0),
+            -((features.get(i['job']['job_id']) or {}).get('size', 0)),
+        ))
+        pending.clear()
+        pending.extend(tasks)
+
+    def eta():
+        # remaining work shared by the running processes, but no less than the longest running job, jobs without
+        # prediction are assumed to take the mean duration so far
+        fallback = sum(durations) / len(durations) if durations else None
+        now = time.time()
+        work, work_running = list(), list()
+        for tasks, is_running in ((pending, False), (running, True)):
+            for task in tasks:
+                v = predicted.get(task['job']['job_id']) or fallback
+                if v is None:
+                    return None
+                if is_running:
+                    work_running.append(max(v - (now - task['time_start']), 0.))
+                else:
+                    work.append(v)
+        n_parallel = max(len(running), n_proc if controller is None else controller.n_min, 1)
+        return max((sum(work) + sum(work_running)) / n_parallel, max(work_running, default=0.))
+
+    def emit(event: str, job: dict, **info):
+        if event_callback is not None:
+            event_callback(event, job, eta=eta(), **info)
+
+    def queue(task: dict, left: bool = False):
+        pending.appendleft(task) if left else pending.append(task)
+        emit('queued', task['job'], attempt=task['attempt'], not_before=task['not_before'])
+
+    pending = deque()
+    running = list()
+    collecting = list()
+    for job in jobs:
+        if is_job_done(job, records.get(job['job_id'])):
+            emit('skipped', job)
+            continue
+        try:
+            features[job['job_id']] = read_in_features(job['fp_in'])
+        except OSError:
+            features[job['job_id']] = None
+        pending.append(dict(job=job, attempt=0, not_before=0.))
+    predict()
+    order()
+    for task in pending:
+        emit('queued', task['job'], attempt=task['attempt'], not_before=task['not_before'])
+    summary = dict(n_total=len(jobs), n_skipped=len(jobs) - len(pending), n_completed=0, n_failed=0)
+    collector = ThreadPoolExecutor(max_workers=2) if dir_scratch is not None else None
+
+    def finished():
+        if progress_callback is not None:
+            progress_callback(
+                summary['n_skipped'] + summary['n_completed'] + summary['n_failed'], summary['n_total'], eta()
+            )
+
+    def done(task: dict, now: float):
+        job_id = task['job']['job_id']
+        manifest.append(
+            job_id, state=task['state'], exit_code=task['exit_code'], duration=task['duration'],
+            attempt=task['attempt'], peak_rss=task['peak_rss'], features=features.get(job_id),
+            **({'error': task['error']} if 'error' in task else {})
+        )
+        if task['state'] == 'completed':
+            durations.append(task['duration'])
+            predictor.add(features.get(job_id), task['duration'])
+            predictor.fit()
+            predict()
+            order()
+            summary['n_completed'] += 1
+            emit(
+                'finished', task['job'], attempt=task['attempt'], exit_code=task['exit_code'],
+                duration=task['duration'], peak_rss=task['peak_rss']
+            )
+            finished()
+        else:
+            retry_or_fail(task, task['state'], now, task['exit_code'], task['duration'])
+
+    def discard_scratch(task: dict):
+        if 'dir_scratch' in task:
+            shutil.rmtree(task.pop('dir_scratch'), ignore_errors=True)
+
+    def retry_or_fail(task: dict, state: str, now: float, exit_code: int = None, duration: float = 0.):
+        is_retry = task['attempt'] < max_retries
+        emit(
+            'failed', task['job'], attempt=task['attempt'], state=state, exit_code=exit_code, duration=duration,
+            retry=is_retry
+        )
+        if is_retry:
+            queue(dict(task, not_before=now + backoff * 2 ** task['attempt'], attempt=task['attempt'] + 1))
+        else:
+            summary['n_failed'] += 1
+            logger.warning(f'Safir job {task["job"]["job_id"]} {state} after {task["attempt"] + 1} attempt(s)')
+            finished()
+
+    finished()
+    try:
+        while pending or running or collecting:
+            if stop_event is not None and stop_event.is_set():
+                break
+            now = time.time()
+
+            # reap finished and timed-out jobs
+            for task in list(running):
+                rss, peak_rss = process_memory(task['proc'].pid)
+                if rss is not None:
+                    task['rss'], task['peak_rss'] = rss, max(task['peak_rss'] or 0, peak_rss)
+                    if controller is not None:
+                        controller.observe(task['peak_rss'])
+                exit_code = task['proc'].poll()
+                duration = now - task['time_start']
+                if exit_code is None:
+                    if task['job']['timeout_seconds'] and duration > task['job']['timeout_seconds']:
+                        task['proc'].kill()
+                        exit_code, state = task['proc'].wait(), 'timeout'
+                    else:
+                        continue
+                else:
+                    state = 'completed' if exit_code == 0 else 'failed'
+                task['f_stdout'].close()
+                running.remove(task)
+                task.update(state=state, exit_code=exit_code, duration=duration)
+                if 'dir_scratch' in task:
+                    task['future'] = collector.submit(
+                        collect_scratch, task['job'], task['dir_scratch'], task['snapshot'], compression
+                    )
+                    collecting.append(task)
+                else:
+                    done(task, now)
+
+            # jobs finish once their outputs are collected from the scratch directory
+            for task in list(collecting):
+                if not task['future'].done():
+                    continue
+                collecting.remove(task)
+                try:
+                    task['future'].result()
+                except Exception as e:
+                    logger.error(f'Failed to collect outputs of Safir job {task["job"]["job_id"]}, {e}')
+                    task.update(state='failed', error=str(e))
+                done(task, now)
+
+            # shed the latest started job to avoid swapping, it is requeued without counting as an attempt
+            if controller is not None and controller.should_shed(running, now):
+                task = max(running, key=lambda i: i['time_start'])
+                task['proc'].kill()
+                task['proc'].wait()
+                task['f_stdout'].close()
+                running.remove(task)
+                discard_scratch(task)
+                manifest.append(
+                    task['job']['job_id'], state='shed', exit_code=None, duration=now - task['time_start'],
+                    attempt=task['attempt'], peak_rss=task['peak_rss']
+                )
+                logger.info(f'Safir job {task["job"]["job_id"]} shed due to low free memory')
+                queue(dict(task, not_before=now + controller.ramp_interval), left=True)
+
+            # dispatch pending jobs which are not in backoff
+            for _ in range(len(pending)):
+                if controller is None and len(running) >= n_proc:
+                    break
+                task = pending.popleft()
+                if task['not_before'] > now:
+                    pending.append(task)
+                    continue
+                peak_rss = peak_rss_history.get(task['job']['job_id'])
+                if controller is not None:
+                    if not controller.can_start(running, peak_rss, now):
+                        pending.appendleft(task)
+                        break
+                    task['expected_rss'] = controller.expected_rss(peak_rss)
+                try:
+                    for k in ('dir_scratch', 'error'):
+                        task.pop(k, None)
+                    if dir_scratch is not None:
+                        task['dir_scratch'], task['snapshot'] = stage_scratch(task['job'], dir_scratch)
+                    task.update(_start(task['job'], task.get('dir_scratch')))
+                except OSError as e:
+                    discard_scratch(task)
+                    manifest.append(
+                        task['job']['job_id'], state='failed', exit_code=None, duration=0., attempt=task['attempt'],
+                        error=str(e)
+                    )
+                    retry_or_fail(task, 'failed', now)
+                    continue
+                manifest.append(task['job']['job_id'], state='running', attempt=task['attempt'])
+                running.append(task)
+                emit('started', task['job'], attempt=task['attempt'], pid=task['proc'].pid)
+                if controller is not None:
+                    controller.started(now)
+
+            time.sleep(poll_interval)
+    finally:
+        for task in running:
+            task['proc'].kill()
+            task['proc'].wait()
+            task['f_stdout'].close()
+            discard_scratch(task)
+            duration = time.time() - task['time_start']
+            manifest.append(
+                task['job']['job_id'], state='cancelled', exit_code=None, duration=duration, attempt=task['attempt']
+            )
+            emit('cancelled', task['job'], attempt=task['attempt'], duration=duration)
+        if collector is not None:
+            # outputs of exited solvers are still collected, their jobs are recorded when run again
+            collector.shutdown(wait=True)
+
+    return summary
+
+
+def _test_run_jobs(dir_work: str, n_jobs: int = 2, timeout: float = 60., dir_scratch: str = None, **kwargs) -> tuple:
+    """Run `n_jobs` jobs with the Safir stand-in configured by `kwargs`, see `fsetoolsGUI.etc.safir_standin`.
+
+    :return:    (summary, list of (event, job_id, info, time of the event)).
+    """
+    from fsetoolsGUI.etc.safir_standin import make_environ, write_standin_exe
+
+    fp_exe = write_standin_exe(dir_work)
+    for i in range(n_jobs):
+        fp_in = os.path.join(dir_work, f'job_{i}', 'model.in')
+        if not os.path.isfile(fp_in):
+            os.makedirs(os.path.dirname(fp_in), exist_ok=True)
+            with open(fp_in, 'w') as f:
+                f.write('NNODE 10\n')
+
+    events = list()
+    environ = os.environ.copy()
+    os.environ.update(make_environ(**dict(dict(duration=0.05, n_shell=2, n_time=2), **kwargs)))
+    try:
+        summary = run_jobs(
+            make_jobs(fp_exe, dir_work, timeout), n_proc=2, dir_work=dir_work, max_retries=2, backoff=0.2,
+            poll_interval=0.02, dir_scratch=dir_scratch,
+            event_callback=lambda event, job, **info: events.append((event, job['job_id'], info, time.time())),
+        )
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+    return summary, events
+
+
+def _test_is_alive(pid: int) -> bool:
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if sys.platform == 'win32':
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def test_run_jobs_resume():
+    with tempfile.TemporaryDirectory() as dir_work:
+        summary, _ = _test_run_jobs(dir_work, n_jobs=3)
+        assert summary == dict(n_total=3, n_skipped=0, n_completed=3, n_failed=0)
+        assert all(os.path.isfile(os.path.join(dir_work, f'job_{i}', 'model.out')) for i in range(3))
+
+        # completed jobs are skipped, a job whose *.in is newer than its *.out is run again
+        os.utime(os.path.join(dir_work, 'job_1', 'model.in'), (time.time() + 10, time.time() + 10))
+        summary, events = _test_run_jobs(dir_work, n_jobs=3)
+        assert summary == dict(n_total=3, n_skipped=2, n_completed=1, n_failed=0)
+        assert [i[1] for i in events if i[0] == 'skipped'] == ['job_0/model.in', 'job_2/model.in']
+        assert [i[1] for i in events if i[0] == 'started'] == ['job_1/model.in']
+
+
+def test_run_jobs_retry():
+    with tempfile.TemporaryDirectory() as dir_work:
+        summary, events = _test_run_jobs(dir_work, n_jobs=1, fail_rate=1.)
+        records = list(Manifest(os.path.join(dir_work, MANIFEST_NAME)).history())
+    assert summary == dict(n_total=1, n_skipped=0, n_completed=0, n_failed=1)
+    assert [(i['state'], i['attempt']) for i in records if i['state'] != 'running'] == [('failed', i) for i in range(3)]
+
+    # one attempt and 2 retries, the n-th retry is queued to wait `backoff * 2 ** (n - 1)`
+    failed = [i[2] for i in events if i[0] == 'failed']
+    assert [(i['attempt'], i['state'], i['exit_code'], i['retry']) for i in failed] == [
+        (0, 'failed', 1, True), (1, 'failed', 1, True), (2, 'failed', 1, False)
+    ]
+    queued = [i for i in events if i[0] == 'queued']
+    started = [i for i in events if i[0] == 'started']
+    assert [i[2]['attempt'] for i in queued] == [0, 1, 2] and [i[2]['attempt'] for i in started] == [0, 1, 2]
+    for (_, _, info, t), wait in zip(queued[1:], (0.2, 0.4)):
+        assert abs(info['not_before'] - t - wait) < 0.1
+    for (_, _, info, _), (_, _, _, t_start) in zip(queued[1:], started[1:]):
+        assert t_start >= info['not_before']
+
+
+def test_run_jobs_timeout():
+    with tempfile.TemporaryDirectory() as dir_work:
+        t0 = time.time()
+        summary, events = _test_run_jobs(dir_work, n_jobs=1, timeout=1., hang_rate=1.)
+        assert time.time() - t0 < 10
+
+    # the hanging job is killed at every attempt, shortly after its timeout
+    failed = [i[2] for i in events if i[0] == 'failed']
+    assert summary['n_failed'] == 1 and [i['state'] for i in failed] == ['timeout'] * 3
+    assert all(1. < i['duration'] < 2. for i in failed)
+    assert not any(_test_is_alive(i[2]['pid']) for i in events if i[0] == 'started')
+
+
+def test_run_jobs_scratch():
+    with tempfile.TemporaryDirectory() as dir_work, tempfile.TemporaryDirectory() as dir_scratch:
+        summary, events = _test_run_jobs(dir_work, n_jobs=2, dir_scratch=dir_scratch, duration=0.5)
+        assert summary == dict(n_total=2, n_skipped=0, n_completed=2, n_failed=0)
+
+        # stdout is written in the scratch directory and collected with the other outputs
+        for i in range(2):
+            fp_stdout = os.path.join(dir_work, f'job_{i}', 'model.stdout.txt')
+            with open(fp_stdout, 'r') as f:
+                assert 'NORMAL END OF CALCULATION' in f.read()
+            assert os.path.isfile(os.path.join(dir_work, f'job_{i}', 'model.out'))
+        assert os.listdir(dir_scratch) == []
+
+        # a job started in a scratch directory writes nothing in its own directory
+        job = make_jobs(os.path.join(dir_work, 'safir_standin.py'), dir_work, 60.)[0]
+        os.remove(job['fp_stdout'])
+        dir_job, _ = stage_scratch(job, dir_scratch)
+        task = _start(job, dir_job)
+        task['proc'].wait()
+        task['f_stdout'].close()
+        assert not os.path.exists(job['fp_stdout'])
+        assert os.path.isfile(os.path.join(dir_job, os.path.basename(job['fp_stdout'])))
+
+
+def test_collect_scratch():
+    with tempfile.TemporaryDirectory() as dir_work, tempfile.TemporaryDirectory() as dir_scratch:
+        with open(os.path.join(dir_work, 'model.in'), 'w') as f:
+            f.write('NNODE 10\n')
+        job = make_job('safir', os.path.join(dir_work, 'model.in'), 60., dir_work)
+        dir_job, snapshot = stage_scratch(job, dir_scratch)
+        assert list(snapshot) == ['model.in']
+
+        for name in ('model.out', 'model.stdout.txt'):
+            with open(os.path.join(dir_job, name), 'w') as f:
+                f.write(name)
+        # the destination of one output is a directory, it fails to be moved but the others are moved
+        os.makedirs(os.path.join(dir_work, 'model.stdout.txt'))
+        try:
+            collect_scratch(job, dir_job, snapshot, 'gzip')
+            raise AssertionError('OSError expected')
+        except OSError as e:
+            assert 'model.stdout.txt,' in str(e) and 'model.out,' not in str(e)
+        assert not os.path.exists(dir_job)
+        with gzip.open(os.path.join(dir_work, 'model.out.gz'), 'rt') as f:
+            assert f.read() == 'model.out'
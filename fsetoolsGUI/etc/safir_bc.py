@@ -0,0 +1,113 @@
+import csv
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from fsetoolsGUI.etc.safir_input_generator import write_if_changed
+
+logger = logging.getLogger('gui')
+
+REDUCTION_NAME = 'bc_reduction.csv'
+REDUCTION_TEMPLATE_NAME = 'bc_reduction_template.csv'
+
+
+def normalise_rel_dir(rel_dir: str) -> str:
+    """Normalise a directory path relative to the batch root directory, with '/' separators and '.' for the root."""
+    rel_dir = rel_dir.strip().replace('\\', '/')
+    rel_dir = os.path.normpath(rel_dir).replace(os.sep, '/') if rel_dir else '.'
+    return rel_dir.lstrip('/') or '.'
+
+
+def index_input_dirs(dir_work: str) -> list:
+    """:return: sorted list of relative paths, see `normalise_rel_dir`, of directories in `dir_work` containing *.in."""
+    rel_dirs = set()
+    for root, dirs, files in os.walk(dir_work):
+        if any(i.endswith('.in') for i in files):
+            rel_dirs.add(normalise_rel_dir(os.path.relpath(root, dir_work)))
+    return sorted(rel_dirs)
+
+
+def make_reduction_template(dir_work: str) -> str:
+    """Write `REDUCTION_TEMPLATE_NAME` in `dir_work` listing every directory containing *.in with a reduction factor
+    of 1, to be edited and saved as `REDUCTION_NAME`.
+
+    :return:    the template file path.
+    """
+    fp = os.path.join(dir_work, REDUCTION_TEMPLATE_NAME)
+    write_if_changed(fp, '\n'.join(['rel_dir,val'] + [f'{i},1' for i in index_input_dirs(dir_work)]) + '\n')
+    return fp
+
+
+def load_reduction(fp: str) -> dict:
+    """Load reduction factors from a *.csv with columns `rel_dir` and `val`, see `make_reduction_template`.
+
+    :return:    dict of {normalised relative directory: reduction factor}.
+    """
+    reduction = dict()
+    with open(fp, 'r', newline='') as f:
+        for row in csv.DictReader(f, skipinitialspace=True):
+            if row.get('rel_dir') is None or not str(row.get('val') or '').strip():
+                continue
+            reduction[normalise_rel_dir(row['rel_dir'])] = float(row['val'])
+    return reduction
+
+
+def validate_reduction(rel_dirs: list, reduction: dict):
+    """Check every directory has a reduction factor.
+
+    :return:    list of directories in `reduction` which contain no *.in, e.g. misspelt.
+    :raises ValueError: when any of `rel_dirs` has no reduction factor.
+    """
+    missing = [i for i in rel_dirs if i not in reduction]
+    if missing:
+        raise ValueError(f'No reduction factor for {len(missing)} directories, {missing[:10]}')
+    rel_dirs = set(rel_dirs)
+    return [i for i in reduction if i not in rel_dirs]
+
+
+def format_bc(bc: np.ndarray) -> str:
+    f = io.StringIO()
+    np.savetxt(f, bc, delimiter=',', fmt='%g')
+    return f.getvalue()
+
+
+def write_batch_bc(dir_work: str, fp_bc: str, fp_reduction: str = None, n_threads: int = 8) -> dict:
+    """Write the boundary condition file `fp_bc` into every directory in `dir_work` containing *.in. When
+    `fp_reduction` is provided, the second column of the boundary condition is multiplied by the reduction factor of
+    each directory, see `load_reduction`.
+
+    Reduction factors are validated for all directories before any file is written. Files are written concurrently,
+    atomically and only if their content changed, so that Safir jobs of unchanged models stay completed.
+
+    :return:    dict of the written file paths `written`, unchanged file paths `unchanged` and directories in the
+                reduction *.csv containing no *.in `unused`.
+    """
+    bc = np.atleast_2d(np.genfromtxt(fp_bc, delimiter=','))
+    rel_dirs = index_input_dirs(dir_work)
+
+    unused = list()
+    if fp_reduction is not None:
+        reduction = load_reduction(fp_reduction)
+        unused = validate_reduction(rel_dirs, reduction)
+        if unused:
+            logger.warning(f'Reduction factors of {len(unused)} directories are unused, {unused[:10]}')
+
+    def render(rel_dir: str) -> str:
+        if fp_reduction is None:
+            return format_bc(bc)
+        bc_ = bc.copy()
+        bc_[:, 1] = bc_[:, 1] * reduction[rel_dir]
+        return format_bc(bc_)
+
+    file_name = os.path.basename(fp_bc)
+    list_fp = [os.path.normpath(os.path.join(dir_work, i, file_name)) for i in rel_dirs]
+    with ThreadPoolExecutor(max_workers=max(n_threads, 1)) as executor:
+        is_written = list(executor.map(write_if_changed, list_fp, executor.map(render, rel_dirs)))
+
+    written = [i for i, j in zip(list_fp, is_written) if j]
+    unchanged = [i for i, j in zip(list_fp, is_written) if not j]
+    logger.info(f'{len(written)} boundary condition files written, {len(unchanged)} unchanged')
+    return dict(written=written, unchanged=unchanged, unused=unused)
@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    import resource
+except ModuleNotFoundError:
+    resource = None
+try:
+    import psutil
+except ModuleNotFoundError:
+    psutil = None
+
+from fsetoolsGUI.etc.safir_pipeline import run_batch
+from fsetoolsGUI.etc.safir_post_processor import (
+    load_strain, make_strain_index, make_strain_lines_for_given_shell, out2pstrain, pstrain2dict, save_csv
+)
+from fsetoolsGUI.etc.safir_standin import make_environ, write_standin_exe
+
+BENCHMARK_STAGES = ('out2pstrain', 'pstrain2dict', 'save_csv', 'make_strain_index', 'make_strain_lines_for_given_shell')
+
+
+def make_synthetic_out(
+        fp: str,
+        n_shell: int = 100,
+        n_surf: int = 2,
+        n_rebar: int = 2,
+        n_time: int = 60,
+        time_step: float = 60.,
+        size: int = None,
+        seed: int = 0,
+) -> dict:
+    """Make a synthetic Safir *.out file with strain records of `n_shell` x `n_surf` x `n_rebar` at every one of
+    `n_time` time steps. Other typical output (node displacements) is interleaved so that the parser has lines to skip.
+
+    :param size:    approximate file size in bytes, overrides `n_time` when provided.
+    :return:        dict of the actual number of time steps, strain records and file size.
+    """
+    rng = np.random.default_rng(seed)
+    shell, surf, rebar = (i.ravel() for i in np.meshgrid(
+        np.arange(1, n_shell + 1), np.arange(1, n_surf + 1), np.arange(1, n_rebar + 1), indexing='ij'
+    ))
+    n_record = len(shell)
+
+    row_fmt = '  SHELL:%6d  SURF:%3d  REBAR:%3d  Total strain: %13.7E  Stress related strain: %13.7E\n'
+    row_fmt_node = ' NODE:%6d  DISPLACEMENT: %13.7E %13.7E %13.7E\n'
+    n_node = max(n_shell // 4, 1)
+
+    def time_block(i_time: int) -> str:
+        strain = rng.normal(0, 1e-3 * (i_time + 1) / n_time, (2, n_record))
+        block = f'\n      TIME =  {(i_time + 1) * time_step:12.4f} SECONDS\n\n'
+        block += (row_fmt_node * n_node) % tuple(
+            v for i in range(n_node) for v in (i + 1, *rng.normal(0, 1e-2, 3))
+        )
+        block += (row_fmt * n_record) % tuple(
+            v for i in zip(shell.tolist(), surf.tolist(), rebar.tolist(), strain[0].tolist(), strain[1].tolist())
+            for v in i
+        )
+        return block
+
+    header = ' SAFIR synthetic output\n NUMBER OF SHELLS %d\n' % n_shell
+    if size is not None:
+        n_time = max(int((size - len(header)) / len(time_block(0))), 1)
+
+    with open(fp, 'w') as f:
+        f.write(header)
+        for i_time in range(n_time):
+            f.write(time_block(i_time))
+
+    return dict(n_time=n_time, n_record=n_time * n_record, size=os.path.getsize(fp))
+
+
+def peak_rss() -> int:
+    """Peak resident set size of the current process in bytes, None if it can not be measured on this platform."""
+    if resource is not None:
+        v = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return v if sys.platform == 'darwin' else v * 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    return None
+
+
+def _run_stage(stage: str, fp_out: str, n_lookup: int) -> dict:
+    """Run one benchmark stage, executed in a fresh process so that the peak RSS belongs to this stage only. Inputs
+    needed by the stage other than the *.out file are prepared (from cache) outside of the timed region."""
+    dir_tmp = os.path.dirname(fp_out)
+    n_record = None
+
+    if stage == 'out2pstrain':
+        t0 = time.perf_counter()
+        out2pstrain(fp_out, os.path.join(dir_tmp, 'bench.out.p'))
+        t1 = time.perf_counter()
+        os.remove(os.path.join(dir_tmp, 'bench.out.p'))
+    elif stage == 'pstrain2dict':
+        t0 = time.perf_counter()
+        n_record = len(pstrain2dict(fp_out)['list_time'])
+        t1 = time.perf_counter()
+    else:
+        dict_out = load_strain(fp_out, n_proc=1)
+        n_record = len(dict_out['list_time'])
+        if stage == 'save_csv':
+            t0 = time.perf_counter()
+            save_csv(os.path.join(dir_tmp, 'bench.csv'), **dict_out)
+            t1 = time.perf_counter()
+            os.remove(os.path.join(dir_tmp, 'bench.csv'))
+        elif stage == 'make_strain_index':
+            t0 = time.perf_counter()
+            make_strain_index(**dict_out)
+            t1 = time.perf_counter()
+        elif stage == 'make_strain_lines_for_given_shell':
+            index = make_strain_index(**dict_out)
+            shells = np.random.default_rng(0).choice(index['unique_shell'], n_lookup)
+            t0 = time.perf_counter()
+            for shell in shells:
+                make_strain_lines_for_given_shell(int(shell), **dict_out, index=index)
+            t1 = time.perf_counter()
+            n_record = n_lookup
+        else:
+            raise ValueError(f'Unknown stage `{stage}`')
+
+    return dict(seconds=t1 - t0, n_record=n_record, peak_rss=peak_rss())
+
+
+def benchmark(fp_out: str, stages: tuple = BENCHMARK_STAGES, n_lookup: int = 100) -> dict:
+    """Benchmark Safir post processing stages on `fp_out`.
+
+    :return:    dict of {stage: {seconds, n_record, peak_rss, mb_per_s, rows_per_s}}, `rows_per_s` of
+                `make_strain_lines_for_given_shell` is the number of shell lookups per second.
+    """
+    size = os.path.getsize(fp_out)
+    results = dict()
+    for stage in stages:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(_run_stage, stage, fp_out, n_lookup).result()
+        result['mb_per_s'] = size / 1e6 / result['seconds'] if result['seconds'] > 0 else None
+        if result['n_record'] is not None and result['seconds'] > 0:
+            result['rows_per_s'] = result['n_record'] / result['seconds']
+        else:
+            result['rows_per_s'] = None
+        results[stage] = result
+    return results
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """Compare throughput of `results` against `baseline`, both made by `benchmark`.
+
+    :return:    list of (stage, baseline MB/s, current MB/s) of stages slower than the baseline by more than
+                `tolerance`, i.e. 0.2 for 20%.
+    """
+    regressions = list()
+    for stage, result in results.items():
+        if stage not in baseline or not baseline[stage].get('mb_per_s') or not result.get('mb_per_s'):
+            continue
+        if result['mb_per_s'] < baseline[stage]['mb_per_s'] * (1 - tolerance):
+            regressions.append((stage, baseline[stage]['mb_per_s'], result['mb_per_s']))
+    return regressions
+
+
+def benchmark_batch(
+        n_jobs: int = 1000,
+        n_proc: int = 8,
+        duration=0.,
+        cpu: float = 0.,
+        fail_rate: float = 0.,
+        hang_rate: float = 0.,
+        timeout: float = 5.,
+        max_retries: int = 0,
+        dir_work: str = None,
+        **kwargs
+) -> dict:
+    """Benchmark the batch runner, `fsetoolsGUI.etc.safir_pipeline.run_batch` as used by the batch run GUI, with
+    `n_jobs` jobs of the Safir stand-in, see `fsetoolsGUI.etc.safir_standin`.
+
+    Scheduling overhead is the time process slots are idle while jobs are waiting, i.e. `n_proc` x wall time less the
+    time of all solver processes, per attempt. It includes the interpreter start up time of the stand-in, measure it
+    with `duration=0`. Timeout latency is how long after their timeout hanging jobs are killed. The batch is then run
+    again, and stopped before any failed job is rerun, to measure how fast completed jobs are skipped.
+
+    :param duration:    see `fsetoolsGUI.etc.safir_standin.make_environ`.
+    :param dir_work:    directory to make the jobs in, a temporary directory if not provided.
+    :param kwargs:      other arguments passed to `run_batch`, e.g. `poll_interval`.
+    :return:            dict of the benchmark results.
+    """
+    if dir_work is None:
+        with tempfile.TemporaryDirectory() as dir_tmp:
+            return benchmark_batch(
+                n_jobs, n_proc, duration, cpu, fail_rate, hang_rate, timeout, max_retries, dir_tmp, **kwargs
+            )
+
+    dir_jobs = os.path.join(dir_work, 'jobs')
+    for i in range(n_jobs):
+        os.makedirs(os.path.join(dir_jobs, f'{i:05d}'), exist_ok=True)
+        with open(os.path.join(dir_jobs, f'{i:05d}', 'model.in'), 'w') as f:
+            f.write(f'stand-in job {i}\n')
+    fp_exe = write_standin_exe(dir_work)
+
+    attempts = list()
+    latency_timeout = list()
+
+    def on_event(event: str, job: dict, **info):
+        if event in ('finished', 'failed'):
+            attempts.append(info['duration'])
+            if info.get('state') == 'timeout':
+                latency_timeout.append(info['duration'] - job['timeout_seconds'])
+
+    environ = os.environ.copy()
+    os.environ.update(make_environ(duration=duration, cpu=cpu, fail_rate=fail_rate, hang_rate=hang_rate))
+    try:
+        t0 = time.perf_counter()
+        summary = run_batch(
+            fp_exe, dir_jobs, timeout=timeout, n_proc=n_proc, max_retries=max_retries, backoff=0.,
+            event_callback=on_event, **kwargs
+        )
+        t1 = time.perf_counter()
+        stop_event = threading.Event()
+        summary_resume = run_batch(
+            fp_exe, dir_jobs, timeout=timeout, n_proc=n_proc, stop_event=stop_event,
+            event_callback=lambda event, job, **info: event == 'queued' and stop_event.set(), **kwargs
+        )
+        t2 = time.perf_counter()
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+
+    seconds = t1 - t0
+    idle = max(n_proc * seconds - sum(attempts), 0.)
+    return dict(
+        n_jobs=n_jobs,
+        n_proc=n_proc,
+        seconds=seconds,
+        jobs_per_min=summary['n_completed'] / seconds * 60,
+        n_completed=summary['n_completed'],
+        n_failed=summary['n_failed'],
+        n_attempt=len(attempts),
+        n_timeout=len(latency_timeout),
+        mean_solver_seconds=float(np.mean(attempts)) if attempts else None,
+        overhead_per_attempt=idle / len(attempts) if attempts else None,
+        overhead_fraction=idle / (n_proc * seconds) if seconds > 0 else None,
+        mean_timeout_latency=float(np.mean(latency_timeout)) if latency_timeout else None,
+        max_timeout_latency=float(np.max(latency_timeout)) if latency_timeout else None,
+        n_resume_skipped=summary_resume['n_skipped'],
+        resume_seconds=t2 - t1,
+    )
+
+
+def _parse_size(v: str) -> int:
+    units = dict(KB=1e3, MB=1e6, GB=1e9)
+    v = v.strip().upper()
+    for k, factor in units.items():
+        if v.endswith(k):
+            return int(float(v[:-len(k)]) * factor)
+    return int(v)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark Safir *.out post processing.')
+    parser.add_argument('--out', help='existing *.out file to benchmark, a synthetic file is made if not provided')
+    parser.add_argument('--size', default='10MB', help='size of the synthetic *.out file, e.g. 10MB, 1GB')
+    parser.add_argument('--n-shell', type=int, default=1000)
+    parser.add_argument('--n-surf', type=int, default=2)
+    parser.add_argument('--n-rebar', type=int, default=2)
+    parser.add_argument('--baseline', help='*.json file of a previous run to check for throughput regressions')
+    parser.add_argument('--save', help='save results to this *.json file, e.g. as a new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before reported, 0.2 is 20%%')
+    parser.add_argument('--batch', type=int, help='benchmark the batch runner with this number of stand-in jobs instead')
+    parser.add_argument('--n-proc', type=int, default=8, help='number of concurrent stand-in jobs of `--batch`')
+    parser.add_argument('--duration', default='0', help='seconds of every stand-in job, or `min,max`')
+    parser.add_argument('--cpu', type=float, default=0., help='fraction of stand-in duration burning CPU')
+    parser.add_argument('--fail-rate', type=float, default=0.)
+    parser.add_argument('--hang-rate', type=float, default=0.)
+    parser.add_argument('--timeout', type=float, default=5., help='seconds before a stand-in job is killed')
+    args = parser.parse_args(args)
+
+    if args.batch:
+        results = benchmark_batch(
+            args.batch, args.n_proc, [float(i) for i in args.duration.split(',')], args.cpu, args.fail_rate,
+            args.hang_rate, args.timeout
+        )
+        for k, v in results.items():
+            print(f'{k:<24}{str(v) if isinstance(v, int) or v is None else f"{v:.3f}":>14}')
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(results, f, indent=4)
+        return 0
+
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        fp_out = args.out
+        if fp_out is None:
+            fp_out = os.path.join(dir_tmp, 'bench.out')
+            info = make_synthetic_out(
+                fp_out, n_shell=args.n_shell, n_surf=args.n_surf, n_rebar=args.n_rebar, size=_parse_size(args.size)
+            )
+            print(f'Synthetic *.out {info["size"] / 1e6:.1f} MB, {info["n_time"]} time steps, '
+                  f'{info["n_record"]} strain records')
+        results = benchmark(fp_out)
+
+    print(f'{"stage":<36}{"seconds":>10}{"MB/s":>10}{"rows/s":>14}{"peak RSS MB":>14}')
+    for stage, v in results.items():
+        print(
+            f'{stage:<36}{v["seconds"]:>10.3f}{v["mb_per_s"] or 0:>10.1f}{v["rows_per_s"] or 0:>14.0f}'
+            f'{(v["peak_rss"] or 0) / 1e6:>14.1f}'
+        )
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for stage, v0, v1 in regressions:
+            print(f'REGRESSION {stage}: {v0:.1f} MB/s -> {v1:.1f} MB/s')
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,546 @@
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+logger = logging.getLogger('gui')
+
+CACHE_VERSION = 1
+
+# bytes parsed at a time, byte tokens of a chunk take a few times its size while being converted into typed columns
+CHUNK_SIZE = 2 ** 23
+
+_RP_TIME_HEADER = re.compile(rb'[^\n]*?TIME[ ]*=[ ]+([0-9.]+)')
+
+
+class RecordType:
+    """Declaration of a type of record, i.e. line, to be extracted from Safir *.out file.
+
+    Each field is declared as (column name, pattern, dtype), the pattern is a bytes regex with exactly one group
+    capturing the value, fields may appear in any order and missing fields are filled with -1. A line is a record of
+    this type when it contains all `required` fields, an item of `required` can also be a tuple of field names of which
+    at least one is required. Every record is stamped with the time of the `TIME = ...` header above it
+    in column `time_column`, records above the first non-zero `TIME` header are ignored.
+
+    Example, nodal temperatures from lines like `NODE:   12  TEMPERATURE:  345.6`:
+        RecordType(
+            'temperature',
+            fields=(
+                ('node', rb'NODE:[ ]*([0-9]+)', np.int32),
+                ('temperature', rb'TEMPERATURE:[ ]*(-?[0-9.]+)', np.float32),
+            ),
+            required=('node', 'temperature'),
+        )
+    """
+
+    def __init__(self, name: str, fields: tuple, required: tuple, time_column: str = 'time', time_dtype=np.float32):
+        self.name = name
+        self.fields = tuple(fields)
+        self.required = tuple((i,) if isinstance(i, str) else tuple(i) for i in required)
+        self.time_column = time_column
+        self.time_dtype = time_dtype
+
+        names = [i[0] for i in self.fields]
+        for i in self.required:
+            for j in i:
+                if j not in names:
+                    raise ValueError(f'Required field `{j}` is not declared in `{name}`')
+
+        # one pattern tokenises every line of a chunk in a single left to right pass, the repeated alternation captures
+        # a `TIME = ...` header (group 1) and fields in any order, groups keep the value of the last iteration they
+        # matched in
+        self.pattern = re.compile(
+            rb'^(?:[^\n]*?(?:TIME[ ]*=[ ]+([0-9.]+)|' + b'|'.join(i[1] for i in self.fields) + rb'))+',
+            re.MULTILINE
+        )
+
+    @property
+    def dtypes(self) -> dict:
+        dtypes = {self.time_column: self.time_dtype}
+        dtypes.update({i[0]: i[2] for i in self.fields})
+        return dtypes
+
+    @property
+    def signature(self) -> str:
+        """Hash of the declaration, used to invalidate caches when the declaration changes."""
+        return hashlib.sha1(
+            repr((self.pattern.pattern, [(k, np.dtype(v).str) for k, v in self.dtypes.items()])).encode()
+        ).hexdigest()
+
+    def empty(self) -> dict:
+        return {k: np.empty(0, dtype=v) for k, v in self.dtypes.items()}
+
+
+class ColumnBuffer:
+    """Growable typed column buffers, the capacity is doubled whenever it runs out."""
+
+    def __init__(self, dtypes: dict, capacity: int = 2 ** 16):
+        self.__size = 0
+        self.__columns = {k: np.empty(max(capacity, 1), dtype=v) for k, v in dtypes.items()}
+
+    def __len__(self):
+        return self.__size
+
+    def extend(self, **columns):
+        n = len(next(iter(columns.values())))
+        capacity = len(next(iter(self.__columns.values())))
+        if self.__size + n > capacity:
+            while self.__size + n > capacity:
+                capacity *= 2
+            for k, v in self.__columns.items():
+                v_ = np.empty(capacity, dtype=v.dtype)
+                v_[:self.__size] = v[:self.__size]
+                self.__columns[k] = v_
+        for k, v in columns.items():
+            self.__columns[k][self.__size:self.__size + n] = v
+        self.__size += n
+
+    def views(self) -> dict:
+        """Return views of the filled part of the columns without copying, views are not updated by later `extend`."""
+        return {k: v[:self.__size] for k, v in self.__columns.items()}
+
+    def to_dict(self, release: bool = False) -> dict:
+        """Return trimmed copies of the columns. When `release` is True, each buffer is dropped as soon as it is
+        copied so that the peak memory is the data size plus one column, the buffer is empty afterwards."""
+        if not release:
+            return {k: v[:self.__size].copy() for k, v in self.__columns.items()}
+        columns = dict()
+        for k in list(self.__columns.keys()):
+            columns[k] = self.__columns.pop(k)[:self.__size].copy()
+        self.__size = 0
+        return columns
+
+
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
+
+def is_compressed(fp: str) -> bool:
+    return fp.endswith(COMPRESSED_SUFFIXES)
+
+
+def open_stream(fp: str):
+    """Open a file for reading bytes, *.gz and *.zst files are decompressed on the fly."""
+    if fp.endswith('.gz'):
+        return gzip.open(fp, 'rb')
+    if fp.endswith('.zst'):
+        if zstandard is None:
+            raise ModuleNotFoundError('Package `zstandard` is required to read *.zst files')
+        return zstandard.ZstdDecompressor().stream_reader(open(fp, 'rb'), closefd=True)
+    return open(fp, 'rb')
+
+
+def _iter_stream_chunks(fp: str, chunk_size: int):
+    with open_stream(fp) as f:
+        tail = b''
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            block = tail + block
+            i = block.rfind(b'\n')
+            if i < 0:
+                tail = block
+                continue
+            tail = block[i + 1:]
+            yield block[:i + 1]
+        if tail:
+            yield tail
+
+
+def iter_chunks(fp: str, chunk_size: int = CHUNK_SIZE, start: int = 0, end: int = None):
+    """Yield `bytes` chunks of approximately `chunk_size` from a memory-mapped file, every chunk ends on a line
+    boundary. Only one chunk is held in memory at a time, pages of the mapped file are evictable by the OS.
+
+    Compressed files, see `COMPRESSED_SUFFIXES`, are decompressed as a stream and can only be read as a whole.
+
+    :param start:   byte offset to start from, expected to be at the beginning of a line.
+    :param end:     byte offset to stop at (exclusive), expected to be at the beginning of a line or end of file.
+    """
+    if is_compressed(fp):
+        if start != 0 or end is not None:
+            raise ValueError(f'Compressed file can only be read as a whole, {fp}')
+        yield from _iter_stream_chunks(fp, chunk_size)
+        return
+
+    size = os.path.getsize(fp)
+    end = size if end is None else min(end, size)
+    if size == 0 or start >= end:
+        return
+    with open(fp, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, 'madvise'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        pos = start
+        while pos < end:
+            end_ = min(pos + chunk_size, end)
+            if end_ < end:
+                i = mm.rfind(b'\n', pos, end_)
+                if i < 0:
+                    i = mm.find(b'\n', end_, end)
+                end_ = end if i < 0 else i + 1
+            yield mm[pos:end_]
+            pos = end_
+
+
+def index_time_blocks(fp: str):
+    """Index `TIME = ...` headers of a Safir *.out file.
+
+    :return:    (offsets, times), byte offsets of the beginning of every header line and the header time values.
+    """
+    offsets, times = list(), list()
+    if os.path.getsize(fp) == 0:
+        return np.array(offsets, dtype=np.int64), np.array(times, dtype=np.float64)
+    with open(fp, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        i = mm.find(b'TIME')
+        while i >= 0:
+            i_start = mm.rfind(b'\n', 0, i) + 1
+            i_end = mm.find(b'\n', i)
+            i_end = len(mm) if i_end < 0 else i_end
+            m = _RP_TIME_HEADER.match(mm[i_start:i_end])
+            if m:
+                offsets.append(i_start)
+                times.append(float(m.group(1)))
+            i = mm.find(b'TIME', i_end)
+    return np.array(offsets, dtype=np.int64), np.array(times, dtype=np.float64)
+
+
+def complete_size(fp: str, size: int = None) -> int:
+    """Byte size of the complete lines of a file still being written, i.e. up to and including the last line break of
+    the file, or of its first `size` bytes."""
+    size = os.path.getsize(fp) if size is None else min(size, os.path.getsize(fp))
+    if size == 0:
+        return 0
+    with open(fp, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm.rfind(b'\n', 0, size) + 1
+
+
+def last_time(fp: str, end: int) -> float:
+    """The last non-zero `TIME = ...` header above byte offset `end` of a Safir *.out file, i.e. the time records
+    from `end` on are stamped with until the next header, 0 if none."""
+    if end <= 0:
+        return 0.
+    with open(fp, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        i = mm.rfind(b'TIME', 0, end)
+        while i >= 0:
+            i_start = mm.rfind(b'\n', 0, i) + 1
+            i_end = mm.find(b'\n', i, end)
+            m = _RP_TIME_HEADER.match(mm[i_start:end if i_end < 0 else i_end])
+            if m and float(m.group(1)) != 0:
+                return float(m.group(1))
+            i = mm.rfind(b'TIME', 0, i_start)
+    return 0.
+
+
+def _bytes2arr(v: np.ndarray, dtype, fill: bytes = b'-1') -> np.ndarray:
+    return np.where(v == b'', fill, v).astype(dtype)
+
+
+def parse_chunk(chunk: bytes, record_types: list, time_current: float = 0.):
+    """Parse records of all `record_types` from a chunk of Safir *.out file directly from bytes into typed columns.
+
+    :param chunk:           bytes, consists of complete lines.
+    :param record_types:    list of `RecordType`.
+    :param time_current:    the time carried over from the previous chunk.
+    :return:                (tables, time_current), `tables` is a dict of {record type name: {column name: array}}.
+    """
+    tables = dict()
+    time_current_ = time_current
+    for record in record_types:
+        matches = record.pattern.findall(chunk)
+        if not matches:
+            tables[record.name] = record.empty()
+            continue
+        time, *values = (np.array(i) for i in zip(*matches))
+        del matches
+
+        # forward fill time from the nearest non-zero `TIME = ...` header above
+        is_header = time != b''
+        time = _bytes2arr(time, np.float64, b'0')
+        is_update = is_header & (time != 0)
+        i_update = np.maximum.accumulate(np.where(is_update, np.arange(len(time)), -1))
+        time = np.where(i_update >= 0, time[i_update], time_current)
+        is_record = ~is_header & (time != 0)
+        values = {i[0]: v for i, v in zip(record.fields, values)}
+        for i in record.required:
+            is_record &= np.logical_or.reduce([values[j] != b'' for j in i])
+
+        columns = {record.time_column: time[is_record].astype(record.time_dtype)}
+        for name, _, dtype in record.fields:
+            columns[name] = _bytes2arr(values[name][is_record], dtype)
+        tables[record.name] = columns
+        time_current_ = float(time[-1])
+    return tables, time_current_
+
+
+def _extract_range(fp: str, record_types: list, start: int, end: int, time_current: float, chunk_size: int) -> dict:
+    # the size of a compressed file underestimates its content, the buffers grow as needed
+    size = (os.path.getsize(fp) if end is None else end) - start
+    buffers = dict()
+    for chunk in iter_chunks(fp, chunk_size, start, end):
+        tables, time_current = parse_chunk(chunk, record_types, time_current)
+        if not buffers:
+            # preallocate from the record density of the first chunk, grows if underestimated
+            for record in record_types:
+                n = len(tables[record.name][record.time_column])
+                buffers[record.name] = ColumnBuffer(record.dtypes, int(n / len(chunk) * size * 1.05))
+        for k, v in tables.items():
+            buffers[k].extend(**v)
+
+    if not buffers:
+        return {i.name: i.empty() for i in record_types}
+    return {k: v.to_dict(release=True) for k, v in buffers.items()}
+
+
+def extract(fp: str, record_types: list, chunk_size: int = CHUNK_SIZE, n_proc: int = 1, size: int = None) -> dict:
+    """Extract records of all `record_types` from Safir *.out file in a single streaming pass.
+
+    The file is memory-mapped and scanned in chunks of `chunk_size` bytes split on line boundaries, each chunk is
+    parsed directly from bytes into preallocated typed columns.
+
+    When `n_proc` is greater than 1 (or 0 for all CPUs) and the file is larger than one chunk, byte offsets of all
+    `TIME` headers are indexed first and contiguous ranges of TIME blocks are parsed in a process pool, results are
+    concatenated in file order.
+
+    Compressed files, see `COMPRESSED_SUFFIXES`, are decompressed as a stream, without being written to disk, and
+    parsed sequentially.
+
+    :param size:    parse only the first `size` bytes, e.g. the complete lines of a file still being written, see
+                    `complete_size`. The whole file by default, and always for compressed files.
+    :return:        dict of {record type name: {column name: array}}.
+    """
+    if is_compressed(fp):
+        return _extract_range(fp, record_types, 0, None, 0., chunk_size)
+
+    size = os.path.getsize(fp) if size is None else min(size, os.path.getsize(fp))
+    n_proc = n_proc or os.cpu_count() or 1
+
+    if n_proc <= 1 or size <= chunk_size:
+        return _extract_range(fp, record_types, 0, size, 0., chunk_size)
+
+    # split file at TIME headers into ranges of similar byte size, a few ranges per process for load balancing
+    offsets, times = index_time_blocks(fp)
+    offsets, times = offsets[offsets < size], times[offsets < size]
+    if len(offsets) < 2:
+        return _extract_range(fp, record_types, 0, size, 0., chunk_size)
+    i_split = np.unique(np.searchsorted(offsets, np.linspace(0, size, n_proc * 4 + 1)[1:-1]))
+    i_split = i_split[(i_split > 0) & (i_split < len(offsets))]
+    starts = np.concatenate([[0], offsets[i_split]])
+    ends = np.concatenate([offsets[i_split], [size]])
+    # the time carried into each range is the last non-zero TIME above it, as the sequential parse would see it
+    i_nonzero = np.maximum.accumulate(np.where(times != 0, np.arange(len(times)), -1))
+    time_initials = [0.] + [float(times[i_nonzero[i - 1]]) if i_nonzero[i - 1] >= 0 else 0. for i in i_split]
+
+    with ProcessPoolExecutor(max_workers=n_proc) as executor:
+        futures = [
+            executor.submit(_extract_range, fp, record_types, int(i), int(j), t, chunk_size)
+            for i, j, t in zip(starts, ends, time_initials)
+        ]
+        results = [future.result() for future in futures]
+
+    # concatenate in file order, results are released as they are copied
+    tables = dict()
+    for record in record_types:
+        n = sum(len(i[record.name][record.time_column]) for i in results)
+        tables[record.name] = {k: np.empty(n, dtype=v) for k, v in record.dtypes.items()}
+    i0 = {i.name: 0 for i in record_types}
+    for i in range(len(results)):
+        result, results[i] = results[i], None
+        for record in record_types:
+            columns = result[record.name]
+            i1 = i0[record.name] + len(columns[record.time_column])
+            for k, v in columns.items():
+                tables[record.name][k][i0[record.name]:i1] = v
+            i0[record.name] = i1
+    return tables
+
+
+def file_identity(fp: str, header_size: int = 2 ** 16) -> dict:
+    """Identity of a file used to validate caches, consists of real path, size, modification time and a hash of the
+    first `header_size` bytes."""
+    stat = os.stat(fp)
+    with open(fp, 'rb') as f:
+        header_hash = hashlib.sha1(f.read(header_size)).hexdigest()
+    return dict(
+        version=CACHE_VERSION, path=os.path.realpath(fp), size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+        header_hash=header_hash,
+    )
+
+
+def cache_dir(fp: str, name: str = 'strain') -> str:
+    """Directory of the cache next to the source file `fp`, i.e. `<fp>.<name>.cache`."""
+    return f'{fp}.{name}.cache'
+
+
+def save_cache(dir_cache: str, identity: dict, columns: dict):
+    """Save `columns` as one *.npy file per column in `dir_cache`. The `meta.json` holding `identity` is written last
+    and atomically so that a partially written cache is never considered valid."""
+    os.makedirs(dir_cache, exist_ok=True)
+    fp_meta = os.path.join(dir_cache, 'meta.json')
+    if os.path.isfile(fp_meta):
+        os.remove(fp_meta)
+    for k, v in columns.items():
+        fp_tmp = os.path.join(dir_cache, f'{k}.tmp.npy')
+        np.save(fp_tmp, np.asarray(v))
+        os.replace(fp_tmp, os.path.join(dir_cache, f'{k}.npy'))
+    with open(fp_meta + '.tmp', 'w') as f:
+        json.dump(dict(identity=identity, columns=list(columns.keys())), f)
+    os.replace(fp_meta + '.tmp', fp_meta)
+
+
+def load_cache(dir_cache: str, identity: dict, mmap_mode: str = 'r'):
+    """Load columns from `dir_cache` as memory-mapped arrays, returns None if the cache is missing or its identity
+    does not match `identity`."""
+    try:
+        with open(os.path.join(dir_cache, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta['identity'] != identity:
+            return None
+        return {k: np.load(os.path.join(dir_cache, f'{k}.npy'), mmap_mode=mmap_mode) for k in meta['columns']}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_records(
+        fp: str, record_types: list, n_proc: int = 0, chunk_size: int = CHUNK_SIZE, use_cache: bool = True,
+        size: int = None
+) -> dict:
+    """Extract records of all `record_types` from Safir *.out file, see `extract`.
+
+    Tables are cached next to `fp` per record type in a columnar binary format and reused as memory-mapped arrays
+    while the path, size, modification time and header of `fp` and the record type declaration are unchanged. Record
+    types without a valid cache are extracted together in a single pass.
+
+    :param size:    see `extract`, tables of the first `size` bytes are cached as of a file of `size`.
+    """
+    if not use_cache:
+        return extract(fp, record_types, chunk_size=chunk_size, n_proc=n_proc, size=size)
+
+    identity = file_identity(fp)
+    if size is not None and not is_compressed(fp):
+        identity['size'] = min(size, identity['size'])
+    tables, missing = dict(), list()
+    for record in record_types:
+        table = load_cache(cache_dir(fp, record.name), dict(identity, schema=record.signature))
+        if table is None:
+            missing.append(record)
+        else:
+            tables[record.name] = table
+
+    if missing:
+        tables_missing = extract(fp, missing, chunk_size=chunk_size, n_proc=n_proc, size=identity['size'])
+        for record in missing:
+            dir_cache = cache_dir(fp, record.name)
+            try:
+                save_cache(dir_cache, dict(identity, schema=record.signature), tables_missing[record.name])
+            except OSError as e:
+                logger.warning(f'Failed to save cache {dir_cache}, {e}')
+        tables.update(tables_missing)
+
+    return {i.name: tables[i.name] for i in record_types}
+
+
+_TEST_RECORD = RecordType(
+    'temperature',
+    fields=(
+        ('node', rb'NODE:[ ]*([0-9]+)', np.int32),
+        ('temperature', rb'TEMPERATURE:[ ]*(-?[0-9.]+)', np.float32),
+        ('flux', rb'FLUX:[ ]*(-?[0-9.]+)', np.float32),
+    ),
+    required=('node', ('temperature', 'flux')),
+)
+
+_TEST_OUT = b'''\
+ SAFIR
+      TIME =       0.0000 SECONDS
+ NODE:    1  TEMPERATURE:   20.0
+      TIME =      60.0000 SECONDS
+ NODE:    1  TEMPERATURE:  100.5
+ NODE:    2
+ NODE:    3  TEMPERATURE:  120.0  FLUX:  5.5
+      TIME =     120.0000 SECONDS
+ NODE:    1  TEMPERATURE:  200.0
+ TEMPERATURE:  210.0  NODE:    2  FLUX:  7.0
+ FLUX:  8.0  NODE:    3
+'''
+
+
+def _test_write_out(dir_work: str, content: bytes = _TEST_OUT, name: str = 'test.out') -> str:
+    fp = os.path.join(dir_work, name)
+    with (gzip.open if fp.endswith('.gz') else open)(fp, 'wb') as f:
+        f.write(content)
+    return fp
+
+
+def test_extract():
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as dir_work:
+        table = extract(_test_write_out(dir_work), [_TEST_RECORD])['temperature']
+
+    # records above the first non-zero TIME are ignored, lines without temperature nor flux are not records
+    assert table['time'].tolist() == [60, 60, 120, 120, 120]
+    assert table['node'].tolist() == [1, 3, 1, 2, 3]
+    # fields in any order, missing fields are filled with -1
+    assert table['temperature'].tolist() == [100.5, 120, 200, 210, -1]
+    assert table['flux'].tolist() == [-1, 5.5, -1, 7, 8]
+    assert table['node'].dtype == np.int32 and table['flux'].dtype == np.float32
+
+
+def test_extract_parallel_and_compressed():
+    import tempfile
+
+    # TIME blocks repeated with increasing time
+    block = _TEST_OUT[_TEST_OUT.index(b'      TIME =      60'):]
+    content = _TEST_OUT + b''.join(
+        block.replace(b'      60.0000', f'{i * 120 + 60:13.4f}'.encode())
+        .replace(b'     120.0000', f'{i * 120 + 120:13.4f}'.encode())
+        for i in range(1, 20)
+    )
+    with tempfile.TemporaryDirectory() as dir_work:
+        fp = _test_write_out(dir_work, content)
+        table = extract(fp, [_TEST_RECORD])['temperature']
+        table_parallel = extract(fp, [_TEST_RECORD], chunk_size=256, n_proc=2)['temperature']
+        table_gz = extract(_test_write_out(dir_work, content, 'test.out.gz'), [_TEST_RECORD], chunk_size=256)
+        table_gz = table_gz['temperature']
+
+    assert len(table['time']) == 20 * 5 and table['time'][-1] == 20 * 120
+    for k, v in table.items():
+        assert np.array_equal(v, table_parallel[k]), k
+        assert np.array_equal(v, table_gz[k]), k
+
+
+def test_load_records_cache():
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as dir_work:
+        fp = _test_write_out(dir_work)
+        table = load_records(fp, [_TEST_RECORD], n_proc=1)['temperature']
+        assert not isinstance(table['node'], np.memmap)
+        table = load_records(fp, [_TEST_RECORD], n_proc=1)['temperature']
+        assert isinstance(table['node'], np.memmap)
+        assert table['node'].tolist() == [1, 3, 1, 2, 3]
+
+        # the same size but modified, the cache is rebuilt
+        stat = os.stat(fp)
+        _test_write_out(dir_work, _TEST_OUT.replace(b'NODE:    3  TEMPERATURE', b'NODE:    4  TEMPERATURE'))
+        os.utime(fp, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        table = load_records(fp, [_TEST_RECORD], n_proc=1)['temperature']
+        assert not isinstance(table['node'], np.memmap)
+        assert table['node'].tolist() == [1, 4, 1, 2, 3]
+
+        # appended, the cache is rebuilt
+        with open(fp, 'ab') as f:
+            f.write(b' NODE:    5  TEMPERATURE:  300.0\n')
+        table = load_records(fp, [_TEST_RECORD], n_proc=1)['temperature']
+        assert table['node'].tolist() == [1, 4, 1, 2, 3, 5]
+        assert isinstance(load_records(fp, [_TEST_RECORD], n_proc=1)['temperature']['node'], np.memmap)
@@ -0,0 +1,135 @@
+import csv
+import hashlib
+import io
+import itertools
+import logging
+import os
+import re
+import stat
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+
+from fsetoolsGUI.etc.safir_batch import make_job
+
+logger = logging.getLogger('gui')
+
+VARIANTS_NAME = 'safir_variants.csv'
+
+# read once, as setting the umask to read it is not thread safe and files are written by threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def load_grid_csv(fp: str) -> list:
+    """Load a parameter grid from *.csv, the header row are parameter names and every other row is one variant. Values
+    are kept as text as they are to be substituted into the template. An optional `name` column names the variants."""
+    with open(fp, 'r', newline='') as f:
+        return [{k.strip(): v.strip() for k, v in row.items()} for row in csv.DictReader(f)]
+
+
+def make_grid_product(**ranges) -> list:
+    """Make a parameter grid of all combinations of the given parameter values.
+
+    Example:
+        make_grid_product(fire_curve=['ISO834', 'HYDROCARB'], load_ratio=[0.3, 0.5, 0.7])
+    """
+    keys = list(ranges.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*ranges.values())]
+
+
+def variant_name(params: dict, name_fmt: str = None) -> str:
+    """Name of a variant, used as its sub-directory name. `params['name']` is used when present, otherwise `name_fmt`
+    formatted with `params`, e.g. '{fire_curve}_lr{load_ratio}', or all parameters when `name_fmt` is not provided."""
+    if params.get('name'):
+        name = str(params['name'])
+    elif name_fmt is not None:
+        name = name_fmt.format(**params)
+    else:
+        name = '_'.join(f'{k}-{v}' for k, v in params.items())
+    return re.sub(r'[^A-Za-z0-9.\-]+', '_', name).strip('_.')
+
+
+def write_if_changed(fp: str, content: str) -> bool:
+    """Write `content` to `fp` atomically unless `fp` already has the same content, compared by hash. An unchanged
+    file is not touched so that its modification time, and therefore completed Safir jobs, stays valid.
+
+    :return:    True if written.
+    """
+    data = content.encode()
+    if os.path.isfile(fp) and os.path.getsize(fp) == len(data):
+        with open(fp, 'rb') as f:
+            if hashlib.sha1(f.read()).digest() == hashlib.sha1(data).digest():
+                return False
+
+    os.makedirs(os.path.dirname(fp) or '.', exist_ok=True)
+    # `mkstemp` makes the file readable by the owner only, give it the mode of the file it replaces or of a new file
+    mode = stat.S_IMODE(os.stat(fp).st_mode) if os.path.isfile(fp) else 0o666 & ~_UMASK
+    fd, fp_tmp = tempfile.mkstemp(dir=os.path.dirname(fp) or '.', prefix=os.path.basename(fp), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(fp_tmp, mode)
+        os.replace(fp_tmp, fp)
+    except BaseException:
+        os.remove(fp_tmp)
+        raise
+    return True
+
+
+def generate_inputs(fp_template: str, grid: list, dir_out: str, name_fmt: str = None, n_threads: int = 8) -> list:
+    """Render a template Safir *.in file for every variant of `grid` into `dir_out/<variant name>/<template name>`.
+
+    The template refers to parameters as `$name` or `${name}`, see `string.Template`, a literal `$` is written as
+    `$$`. Every parameter in the template must be provided by every variant. Files are written in parallel, atomically
+    and only if their content changed, see `write_if_changed`. The variants and their parameters are listed in
+    `VARIANTS_NAME` in `dir_out` by their `job_id`, the same as in the batch manifest and summary.
+
+    :param grid:    list of dict of {parameter name: value}, see `load_grid_csv` and `make_grid_product`.
+    :return:        list of (*.in file path, whether written) in the order of `grid`.
+    """
+    with open(fp_template, 'r') as f:
+        template = Template(f.read())
+
+    names = [variant_name(params, name_fmt) for params in grid]
+    duplicated = sorted(k for k, v in Counter(names).items() if v > 1)
+    if duplicated:
+        raise ValueError(f'Variant names are not unique, {duplicated}, provide a `name` column or `name_fmt`')
+
+    # render all before writing any so that a missing parameter does not leave a partially generated tree
+    file_name = os.path.basename(fp_template)
+    list_fp_in = [os.path.join(dir_out, name, file_name) for name in names]
+    contents = list()
+    for name, params in zip(names, grid):
+        try:
+            contents.append(template.substitute({k: str(v) for k, v in params.items()}))
+        except KeyError as e:
+            raise KeyError(f'Parameter {e} is not provided by variant `{name}`')
+
+    with ThreadPoolExecutor(max_workers=max(n_threads, 1)) as executor:
+        is_written = list(executor.map(write_if_changed, list_fp_in, contents))
+
+    columns = [k for k in dict.fromkeys(itertools.chain.from_iterable(grid)) if k != 'name']
+    f = io.StringIO(newline='')
+    writer = csv.writer(f)
+    writer.writerow(['job_id', 'name'] + columns)
+    for name, params, fp_in in zip(names, grid, list_fp_in):
+        job_id = os.path.relpath(fp_in, dir_out).replace(os.sep, '/')
+        writer.writerow([job_id, name] + [params.get(k, '') for k in columns])
+    write_if_changed(os.path.join(dir_out, VARIANTS_NAME), f.getvalue())
+
+    logger.info(f'{sum(is_written)} of {len(grid)} Safir input files written, the others are unchanged')
+    return list(zip(list_fp_in, is_written))
+
+
+def generate_jobs(
+        fp_template: str, grid: list, dir_out: str, fp_safir_exe: str, timeout: float = 1800, name_fmt: str = None
+) -> list:
+    """Generate Safir input files, see `generate_inputs`, and make batch jobs of them to be run by
+    `fsetoolsGUI.etc.safir_batch.run_jobs` with `dir_work=dir_out`. Jobs of unchanged input files which completed in
+    a previous run are skipped by `run_jobs`."""
+    return [
+        make_job(fp_safir_exe, fp_in, timeout, dir_out)
+        for fp_in, _ in generate_inputs(fp_template, grid, dir_out, name_fmt=name_fmt)
+    ]
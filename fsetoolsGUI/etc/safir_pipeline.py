@@ -0,0 +1,156 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fsetoolsGUI.etc.safir_batch import (
+    ConcurrencyController, JsonLinesProgress, check_compression, find_out, make_jobs, run_jobs
+)
+from fsetoolsGUI.etc.safir_post_processor import (
+    load_strain, load_strain_index, make_strain_exceedance, save_strain_exceedance_csv
+)
+
+logger = logging.getLogger('gui')
+
+SUMMARY_NAME = 'safir_batch_summary.csv'
+
+SUMMARY_COLUMNS = dict(
+    job_id='%s',
+    n_record='%d',
+    n_shell='%d',
+    peak_strain='%.7f',
+    peak_strain_shell='%d',
+    peak_strain_time='%g',
+    peak_strain2='%.7f',
+    peak_strain2_shell='%d',
+    peak_strain2_time='%g',
+    n_shell_exceed_strain='%d',
+    n_shell_exceed_strain2='%d',
+    time_exceed_strain='%g',
+    time_exceed_strain2='%g',
+)
+
+
+def post_process_out(fp_out: str, threshold_strain: float = None, threshold_strain2: float = None) -> dict:
+    """Extract and cache strain of a Safir *.out file, which can be compressed, save its exceedance table next to it as
+    `*.strain_exceedance.csv` and summarise the whole model.
+
+    :return:    dict of `SUMMARY_COLUMNS` except `job_id`, peak values are of the shell with the largest magnitude and
+                exceedance time is the earliest of all shells, nan where not available.
+    """
+    dict_out = load_strain(fp_out, n_proc=1)
+    index = load_strain_index(fp_out, dict_out)
+    table = make_strain_exceedance(
+        **dict_out, threshold_strain=threshold_strain, threshold_strain2=threshold_strain2, index=index
+    )
+    save_strain_exceedance_csv(fp_out + '.strain_exceedance.csv', table)
+
+    def peak(column: str):
+        v = np.abs(table[column])
+        if not np.any(np.isfinite(v)):
+            return np.nan, -1, np.nan
+        i = np.nanargmax(v)
+        return table[column][i], table['shell'][i], table[f'{column}_time'][i]
+
+    def earliest(column: str):
+        v = table[column]
+        return np.nanmin(v) if np.any(np.isfinite(v)) else np.nan
+
+    summary = dict(n_record=len(dict_out['list_time']), n_shell=len(table['shell']))
+    summary['peak_strain'], summary['peak_strain_shell'], summary['peak_strain_time'] = peak('peak_strain')
+    summary['peak_strain2'], summary['peak_strain2_shell'], summary['peak_strain2_time'] = peak('peak_strain2')
+    summary['n_shell_exceed_strain'] = np.count_nonzero(np.isfinite(table['time_exceed_strain']))
+    summary['n_shell_exceed_strain2'] = np.count_nonzero(np.isfinite(table['time_exceed_strain2']))
+    summary['time_exceed_strain'] = earliest('time_exceed_strain')
+    summary['time_exceed_strain2'] = earliest('time_exceed_strain2')
+    return summary
+
+
+def save_summary_csv(fp: str, rows: list):
+    """Save rows made by `post_process_out`, with `job_id`, as *.csv."""
+    with open(fp, 'w') as f:
+        f.write(','.join(SUMMARY_COLUMNS.keys()) + '\n')
+        for row in rows:
+            f.write(','.join(fmt % row[k] for k, fmt in SUMMARY_COLUMNS.items()) + '\n')
+
+
+def run_pipeline(
+        jobs: list,
+        dir_work: str,
+        n_post: int = 1,
+        threshold_strain: float = None,
+        threshold_strain2: float = None,
+        event_callback=None,
+        **kwargs
+) -> dict:
+    """Run jobs with `fsetoolsGUI.etc.safir_batch.run_jobs` and post process every completed job, see
+    `post_process_out`, on a separate pool of `n_post` processes while other jobs are still being solved. Jobs skipped
+    as completed in a previous run are post processed too, which is fast when their cache is valid.
+
+    The summary of all post processed jobs is saved as `SUMMARY_NAME` in `dir_work` once the last one finishes.
+
+    :param kwargs:  other arguments passed to `run_jobs`.
+    :return:        the dict returned by `run_jobs`, with number of post processed jobs `n_post_processed` and
+                    summary file path `fp_summary`.
+    """
+    futures = dict()
+    with ProcessPoolExecutor(max_workers=max(n_post, 1)) as executor:
+        def on_event(event: str, job: dict, **info):
+            if event in ('skipped', 'finished'):
+                futures[job['job_id']] = executor.submit(
+                    post_process_out, find_out(job['fp_out']) or job['fp_out'], threshold_strain, threshold_strain2
+                )
+            if event_callback is not None:
+                event_callback(event, job, **info)
+
+        summary = run_jobs(jobs, dir_work=dir_work, event_callback=on_event, **kwargs)
+
+        rows = list()
+        for job_id, future in futures.items():
+            try:
+                rows.append(dict(job_id=job_id, **future.result()))
+            except Exception as e:
+                logger.error(f'Failed to post process Safir job {job_id}, {e}')
+
+    summary['n_post_processed'] = len(rows)
+    summary['fp_summary'] = os.path.join(dir_work, SUMMARY_NAME)
+    save_summary_csv(summary['fp_summary'], rows)
+    return summary
+
+
+def run_batch(
+        fp_safir_exe: str,
+        fp_input_root_dir: str,
+        timeout: float = 1800,
+        n_proc: int = 2,
+        n_proc_max: int = None,
+        is_post_process: bool = False,
+        threshold_strain: float = None,
+        threshold_strain2: float = None,
+        f_events=None,
+        **kwargs
+) -> dict:
+    """Run all *.in files in `fp_input_root_dir` with Safir, the same as the batch run GUI but without Qt.
+
+    :param n_proc_max:      when provided, the number of processes adapts between `n_proc` and `n_proc_max`, see
+                            `fsetoolsGUI.etc.safir_batch.ConcurrencyController`.
+    :param is_post_process: whether to post process strain of every completed job, see `run_pipeline`.
+    :param f_events:        text stream to write progress events to as JSON lines, see
+                            `fsetoolsGUI.etc.safir_batch.JsonLinesProgress`.
+    :param kwargs:          other arguments passed to `fsetoolsGUI.etc.safir_batch.run_jobs`.
+    :return:                see `run_jobs` and `run_pipeline`.
+    :raises ValueError, ModuleNotFoundError: when `compression` can not be used, see `check_compression`.
+    """
+    check_compression(kwargs.get('compression'))
+    kwargs.update(
+        jobs=make_jobs(fp_safir_exe, fp_input_root_dir, timeout),
+        n_proc=n_proc,
+        dir_work=fp_input_root_dir,
+        controller=ConcurrencyController(n_min=n_proc, n_max=n_proc_max) if n_proc_max else None,
+    )
+    if f_events is not None:
+        kwargs['event_callback'] = JsonLinesProgress(f_events)
+    if is_post_process:
+        return run_pipeline(threshold_strain=threshold_strain, threshold_strain2=threshold_strain2, **kwargs)
+    return run_jobs(**kwargs)
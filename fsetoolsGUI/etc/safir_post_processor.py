@@ -1,23 +1,204 @@
-import re
+import logging
+import os
+import time
+from itertools import chain
 
 import numpy as np
 
+from fsetoolsGUI.etc.safir_extractor import (
+    CHUNK_SIZE, ColumnBuffer, RecordType, cache_dir, extract, file_identity, is_compressed, last_time, load_cache,
+    load_records, parse_chunk, save_cache
+)
 
-def out2pstrain(fp_out: str, fp_out_strain):
-    """Convert Safir *.out file to a processed output file `fp_out_strain` containing strain data only."""
-    count = 0
-    with open(fp_out, 'r') as f, open(fp_out_strain, 'w+') as f_out_p1:
-        while True:
-            l = f.readline()
-            if l:
-                if 'strain' in l.lower() or 'time' in l.lower():
-                    f_out_p1.write(l)
-                count += 1
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ModuleNotFoundError:
+    pyarrow = None
 
-                if count % 10000 == 0:
-                    print(count, end='\r', flush=True)
-            else:
-                break
+logger = logging.getLogger('gui')
+
+STRAIN_DTYPES = dict(
+    list_time=np.float32,
+    list_shell=np.int32,
+    list_surf=np.int32,
+    list_rebar=np.int32,
+    list_strain=np.float32,
+    list_strain2=np.float32,
+)
+
+_RP_FLOAT = rb'(-?[0-9.]+(?:[Ee][-+]?[0-9]+)?)'
+
+# strain records are lines containing both `SHELL` and `strain`
+STRAIN_RECORD = RecordType(
+    'strain',
+    fields=(
+        ('list_shell', rb'SHELL:[ ]*([0-9]+)', STRAIN_DTYPES['list_shell']),
+        ('list_surf', rb'SURF:[ ]*([0-9]+)', STRAIN_DTYPES['list_surf']),
+        ('list_rebar', rb'REBAR:[ ]*([0-9]+)', STRAIN_DTYPES['list_rebar']),
+        ('list_strain', rb'(?:Total strain|Strain)[ ]*:[ ]*' + _RP_FLOAT, STRAIN_DTYPES['list_strain']),
+        ('list_strain2', rb'Stress related strain[ ]*:[ ]*' + _RP_FLOAT, STRAIN_DTYPES['list_strain2']),
+    ),
+    required=('list_shell', ('list_strain', 'list_strain2')),
+    time_column='list_time',
+    time_dtype=STRAIN_DTYPES['list_time'],
+)
+
+# the same records in float64/int64 columns, as returned by `pstrain2dict` before the typed parser
+_PSTRAIN_DTYPES = dict(
+    list_time=np.float64,
+    list_shell=np.int64,
+    list_surf=np.int64,
+    list_rebar=np.int64,
+    list_strain=np.float64,
+    list_strain2=np.float64,
+)
+_PSTRAIN_RECORD = RecordType(
+    STRAIN_RECORD.name,
+    fields=tuple((name, pattern, _PSTRAIN_DTYPES[name]) for name, pattern, _ in STRAIN_RECORD.fields),
+    required=STRAIN_RECORD.required,
+    time_column='list_time',
+    time_dtype=_PSTRAIN_DTYPES['list_time'],
+)
+
+
+def parse_strain_chunk(chunk: bytes, time_current: float = 0.):
+    """Parse strain records from a chunk of Safir *.out file directly from bytes into typed columns.
+
+    :param chunk:           bytes, consists of complete lines.
+    :param time_current:    the time carried over from the previous chunk.
+    :return:                (columns, time_current), `columns` is a dict of arrays with keys of `STRAIN_DTYPES`.
+    """
+    tables, time_current = parse_chunk(chunk, [STRAIN_RECORD], time_current)
+    return tables[STRAIN_RECORD.name], time_current
+
+
+def out2strain(fp_out: str, chunk_size: int = CHUNK_SIZE, n_proc: int = 1) -> dict:
+    """Extract strain data from Safir *.out file in a single streaming pass, see `pstrain2dict` for the returned dict
+    data structure and `fsetoolsGUI.etc.safir_extractor.extract` for `chunk_size` and `n_proc`.
+
+    Missing SHELL/SURF/REBAR/strain fields are filled with -1. Strain records are only collected once a non-zero `TIME`
+    header has been encountered.
+    """
+    return extract(fp_out, [STRAIN_RECORD], chunk_size=chunk_size, n_proc=n_proc)[STRAIN_RECORD.name]
+
+
+def load_strain(
+        fp_out: str, n_proc: int = 0, chunk_size: int = CHUNK_SIZE, use_cache: bool = True, size: int = None
+) -> dict:
+    """Extract strain data from Safir *.out file, see `pstrain2dict` for the returned dict data structure.
+
+    Results are cached next to `fp_out` in a columnar binary format and reused as memory-mapped arrays while the path,
+    size, modification time and header of `fp_out` are unchanged, see `fsetoolsGUI.etc.safir_extractor.load_records`.
+
+    :param size:    extract the first `size` bytes only, e.g. to be followed by `StrainTail.seed`.
+    """
+    return load_records(
+        fp_out, [STRAIN_RECORD], n_proc=n_proc, chunk_size=chunk_size, use_cache=use_cache, size=size
+    )[STRAIN_RECORD.name]
+
+
+class StrainTail:
+    """Follow a Safir *.out file that is still being written and parse strain data appended to it incrementally.
+
+    The byte offset of the last complete line parsed and the current TIME are remembered between polls, only bytes
+    appended since the previous poll are read. Polls are throttled to no more than one every `min_interval` seconds
+    and, after the initial catch-up, to reading no more than `max_bytes` per poll so that the solver is not starved of
+    disk I/O.
+    """
+
+    def __init__(self, fp_out: str, min_interval: float = 5., max_bytes: int = CHUNK_SIZE):
+        if is_compressed(fp_out):
+            raise ValueError(f'Compressed *.out file can not be followed, {fp_out}')
+        self.fp_out = fp_out
+        self.min_interval = min_interval
+        self.max_bytes = max_bytes
+
+        self.__offset = 0
+        self.__time_current = 0.
+        self.__t_last_poll = None
+        self.__buffer = ColumnBuffer(STRAIN_DTYPES)
+
+    def poll(self, force: bool = False) -> int:
+        """Parse newly appended complete lines, returns the number of new strain records."""
+        t_now = time.monotonic()
+        is_catch_up = self.__t_last_poll is None
+        if not (force or is_catch_up) and t_now - self.__t_last_poll < self.min_interval:
+            return 0
+        self.__t_last_poll = t_now
+
+        size = os.path.getsize(self.fp_out)
+        if size < self.__offset:
+            # file truncated, e.g. the solver restarted, start over
+            self.reset()
+        if size == self.__offset:
+            return 0
+
+        n = 0
+        read_size = CHUNK_SIZE if is_catch_up else self.max_bytes
+        with open(self.fp_out, 'rb') as f:
+            f.seek(self.__offset)
+            for chunk in iter(lambda: f.read(read_size), b''):
+                i = chunk.rfind(b'\n')
+                if i < 0:
+                    break  # no complete line yet
+                chunk = chunk[:i + 1]
+                columns, self.__time_current = parse_strain_chunk(chunk, self.__time_current)
+                self.__buffer.extend(**columns)
+                self.__offset += len(chunk)
+                n += len(columns['list_time'])
+                if not is_catch_up:
+                    break
+                f.seek(self.__offset)
+        return n
+
+    def seed(self, data: dict, size: int):
+        """Continue from strain data already extracted from the first `size` bytes of the file, e.g. by `load_strain`
+        with the same `size`, so that only bytes appended after them are parsed. `size` is expected to end on a line
+        break, see `fsetoolsGUI.etc.safir_extractor.complete_size`."""
+        self.reset()
+        if len(data['list_time']) > 0:
+            self.__buffer.extend(**{k: np.asarray(v) for k, v in data.items()})
+        self.__offset = size
+        self.__time_current = last_time(self.fp_out, size)
+
+    def reset(self):
+        self.__offset = 0
+        self.__time_current = 0.
+        self.__buffer = ColumnBuffer(STRAIN_DTYPES)
+
+    @property
+    def offset(self) -> int:
+        return self.__offset
+
+    @property
+    def time_current(self) -> float:
+        return self.__time_current
+
+    @property
+    def data(self) -> dict:
+        """Strain data parsed so far, see `pstrain2dict` for the dict data structure. Arrays are views and are not
+        updated by later polls."""
+        return self.__buffer.views()
+
+
+def out2pstrain(fp_out: str, fp_out_strain, chunk_size: int = 2 ** 18):
+    """Convert Safir *.out file to a processed output file `fp_out_strain` containing strain data only, i.e. `TIME`
+    headers and strain records, extracted by `pstrain2dict` in a single pass."""
+    data = pstrain2dict(fp_out)
+    list_time = data['list_time']
+    columns = [data[k] for k in ('list_shell', 'list_surf', 'list_rebar', 'list_strain', 'list_strain2')]
+    row_fmt = '  SHELL:%6d  SURF:%3d  REBAR:%3d  Total strain: %13.7E  Stress related strain: %13.7E\n'
+
+    # one `TIME` header above every run of records with the same time
+    i_time = np.flatnonzero(np.diff(list_time, prepend=np.nan) != 0)
+    with open(fp_out_strain, 'w') as f:
+        for i, j in zip(i_time, chain(i_time[1:], [len(list_time)])):
+            f.write(f'      TIME = {list_time[i]:12.4f} SECONDS\n')
+            for k in range(i, j, chunk_size):
+                values = tuple(chain.from_iterable(zip(*[v[k:min(k + chunk_size, j)].tolist() for v in columns])))
+                f.write((row_fmt * (len(values) // len(columns))) % values)
 
 
 def pstrain2dict(fp: str) -> dict:
@@ -31,72 +212,105 @@ def pstrain2dict(fp: str) -> dict:
         list_strain: [...],
         list_strain2: [...],
     }
-    All elements in the dict have the same length.
+    All elements in the dict have the same length, times and strains are float64, shell/surf/rebar are int64. See
+    `out2strain` for the same data in the smaller dtypes of `STRAIN_DTYPES`.
     """
-    rp_time_str = re.compile(r'TIME[ ]*=[ ]+[0-9.0-9]+')
-    rp_time_val = re.compile(r'[0-9.0-9]+')
-    rp_shell_str = re.compile(r'SHELL:[ ]*[0-9]+')
-    rp_shell_val = re.compile(r'[0-9]+')
-    rp_surf_str = re.compile(r'SURF:[ ]*[0-9]+')
-    rp_surf_val = re.compile(r'[0-9]+')
-    rp_rebar_str = re.compile(r'REBAR:[ ]*[0-9]+')
-    rp_rebar_val = re.compile(r'[0-9]+')
-    rp_strain_str = re.compile(r'Total strain[ ]*:[ ]*[-0-9.]+|Strain[ ]*:[ ]*[-0-9.]+')
-    rp_strain_val = re.compile(r'[-0-9.]+')
-    rp_strain_str2 = re.compile(r'Stress related strain[ ]*:[ -]*[0-9.]+')
-    rp_strain_val2 = re.compile(r'[-0-9.]+')
-
-    def get_value(s, rp1, rp2):
-        s1 = rp1.findall(s)
-        if s1:
-            return float(rp2.findall(s1[0])[0])
-        else:
-            return None
-
-    time_current = 0
-    list_time, list_shell, list_surf, list_rebar, list_strain, list_strain2 = [], [], [], [], [], []
-    with open(fp, 'r') as f:
-        while True:
-            l = f.readline()
-            if not l:
-                break
-            else:
-                time = get_value(l, rp_time_str, rp_time_val)
-                if time:
-                    time_current = time
-                elif time_current and 'SHELL' in l:
-                    list_time.append(time_current)
-                    list_shell.append(get_value(l, rp_shell_str, rp_shell_val))
-                    list_surf.append(get_value(l, rp_surf_str, rp_surf_val))
-                    list_rebar.append(get_value(l, rp_rebar_str, rp_rebar_val))
-                    list_strain.append(get_value(l, rp_strain_str, rp_strain_val))
-                    list_strain2.append(get_value(l, rp_strain_str2, rp_strain_val2))
-
-    def list2arr(data: list, dtype):
-        data = np.array(data)
-        data[data is None] = -1
-        return np.array(data, dtype=dtype)
-
-    list_time = list2arr(list_time, float)
-    list_shell = list2arr(list_shell, int)
-    list_surf = list2arr(list_surf, int)
-    list_rebar = list2arr(list_rebar, int)
-    list_strain = list2arr(list_strain, float)
-    list_strain2 = list2arr(list_strain2, float)
+    return extract(fp, [_PSTRAIN_RECORD])[_PSTRAIN_RECORD.name]
+
+
+def save_csv(fp: str, list_time, list_shell, list_surf, list_rebar, list_strain, list_strain2, chunk_size: int = 2 ** 18):
+    """Save strain data as *.csv. Rows are formatted directly from the typed columns `chunk_size` rows at a time, the
+    output is identical to `np.savetxt` with the same header and formats."""
+    columns = (list_time, list_shell, list_surf, list_rebar, list_strain, list_strain2)
+    row_fmt = ','.join(['%10d', '%10d', '%10d', '%10d', '%10.7f', '%10.7f']) + '\n'
+    with open(fp, 'w') as f:
+        f.write('# time,shell,surf,rebar,strain,stress strain\n')
+        for i in range(0, len(list_time), chunk_size):
+            values = tuple(chain.from_iterable(zip(*[np.asarray(v[i:i + chunk_size]).tolist() for v in columns])))
+            f.write((row_fmt * (len(values) // len(columns))) % values)
+
+
+def save_npy(dir_out: str, **columns):
+    """Save strain data as one *.npy file per column in `dir_out`, i.e. `time.npy`, `shell.npy` etc."""
+    os.makedirs(dir_out, exist_ok=True)
+    for k, v in columns.items():
+        np.save(os.path.join(dir_out, f'{k.replace("list_", "", 1)}.npy'), np.asarray(v))
+
+
+def save_arrow(fp: str, file_format: str = None, **columns):
+    """Save strain data as Parquet or Feather file, requires `pyarrow`.
+
+    :param fp:          output file path.
+    :param file_format: 'parquet' or 'feather', inferred from the extension of `fp` if not provided.
+    :param columns:     strain data as returned by `pstrain2dict`.
+    """
+    if pyarrow is None:
+        raise ModuleNotFoundError('`pyarrow` is required to save Parquet/Feather files')
+    file_format = file_format or os.path.splitext(fp)[1].lstrip('.').lower()
+    table = pyarrow.table({k.replace('list_', '', 1): np.asarray(v) for k, v in columns.items()})
+    if file_format == 'parquet':
+        pyarrow.parquet.write_table(table, fp)
+    elif file_format == 'feather':
+        pyarrow.feather.write_feather(table, fp)
+    else:
+        raise ValueError(f'Unknown file format `{file_format}`')
+
+
+def make_strain_index(list_shell, list_surf, list_rebar, **_) -> dict:
+    """Make a grouped index of strain records by (shell, surf, rebar).
+
+    Records are lexsorted by shell, surf and rebar, the sort is stable so records within a group keep their file (i.e.
+    time) order. The resulting dict data structure:
+    {
+        order: [...],               record indices in sorted order
+        group_offsets: [...],       start of each (shell, surf, rebar) group in `order`, with a trailing end offset
+        group_surf: [...],          surf of each group
+        group_rebar: [...],         rebar of each group
+        unique_shell: [...],        sorted unique shells
+        shell_offsets: [...],       start of each shell in the group arrays, with a trailing end offset
+    }
+    """
+    list_shell, list_surf, list_rebar = np.asarray(list_shell), np.asarray(list_surf), np.asarray(list_rebar)
+    order = np.lexsort((list_rebar, list_surf, list_shell))
+    shell, surf, rebar = list_shell[order], list_surf[order], list_rebar[order]
+
+    is_group_start = np.ones(len(order), dtype=bool)
+    is_group_start[1:] = (shell[1:] != shell[:-1]) | (surf[1:] != surf[:-1]) | (rebar[1:] != rebar[:-1])
+    group_starts = np.flatnonzero(is_group_start)
+    group_shell = shell[group_starts]
+
+    is_shell_start = np.ones(len(group_starts), dtype=bool)
+    is_shell_start[1:] = group_shell[1:] != group_shell[:-1]
+    shell_starts = np.flatnonzero(is_shell_start)
 
     return dict(
-        list_time=list_time, list_shell=list_shell, list_surf=list_surf,
-        list_rebar=list_rebar, list_strain=list_strain, list_strain2=list_strain2,
+        order=order,
+        group_offsets=np.append(group_starts, len(order)),
+        group_surf=surf[group_starts],
+        group_rebar=rebar[group_starts],
+        unique_shell=group_shell[shell_starts],
+        shell_offsets=np.append(shell_starts, len(group_starts)),
     )
 
 
-def save_csv(fp: str, list_time, list_shell, list_surf, list_rebar, list_strain, list_strain2):
-    data = zip(list_time, list_shell, list_surf, list_rebar, list_strain, list_strain2)
-    data_list = [[j for j in i] for i in data]
-    data_arr = np.array(data_list, dtype=float)
-    np.savetxt(fp, data_arr, delimiter=",",
-               header='time,shell,surf,rebar,strain,stress strain',
-               fmt=['%10d', '%10d', '%10d', '%10d', '%10.7f', '%10.7f'])
+def load_strain_index(fp_out: str, dict_out: dict, use_cache: bool = True) -> dict:
+    """Make the grouped index of `dict_out` extracted from `fp_out`, see `make_strain_index`. The index is cached next
+    to `fp_out` the same way as `load_strain`, and invalidated with it when `STRAIN_RECORD` changes."""
+    if not use_cache:
+        return make_strain_index(**dict_out)
+
+    identity = dict(file_identity(fp_out), schema=STRAIN_RECORD.signature)
+    dir_cache = cache_dir(fp_out, 'strain_index')
+    index = load_cache(dir_cache, identity)
+    if index is not None:
+        return index
+
+    index = make_strain_index(**dict_out)
+    try:
+        save_cache(dir_cache, identity, index)
+    except OSError as e:
+        logger.warning(f'Failed to save cache {dir_cache}, {e}')
+    return index
 
 
 def make_strain_lines_for_given_shell(
@@ -106,9 +320,27 @@ def make_strain_lines_for_given_shell(
         list_surf,
         list_rebar,
         list_strain,
-        list_strain2
+        list_strain2,
+        index: dict = None,
 ):
-    """"""
+    """Make strain lines of every (surf, rebar) of `unique_shell`. When `index` made by `make_strain_index` is
+    provided, lines are sliced from the index rather than masking the full length arrays."""
+    if index is not None:
+        i = np.searchsorted(index['unique_shell'], unique_shell)
+        if i >= len(index['unique_shell']) or index['unique_shell'][i] != unique_shell:
+            return []
+        list_lines = []
+        for j in range(index['shell_offsets'][i], index['shell_offsets'][i + 1]):
+            i_records = index['order'][index['group_offsets'][j]:index['group_offsets'][j + 1]]
+            list_lines.append(
+                dict(
+                    x=list_time[i_records],
+                    y=list_strain[i_records],
+                    label=f'surf {index["group_surf"][j]:g} rebar {index["group_rebar"][j]:g}'
+                )
+            )
+        return list_lines
+
     list_unique_surf = list(set(list_surf[list_shell == unique_shell]))
     list_unique_surf.sort()
 
@@ -135,3 +367,124 @@ def make_strain_lines_for_given_shell(
                 )
 
     return list_lines
+
+
+def align_series(list_x: list, list_y: list, fill=np.nan) -> np.ndarray:
+    """Align any number of (x, y) series onto the sorted union of their x values.
+
+    :param list_x:  list of x arrays, one per series, need not be sorted.
+    :param list_y:  list of y arrays of the same lengths as `list_x`.
+    :param fill:    value of a series at x it does not contain, or 'ffill' to carry forward its last value (NaN before
+                    its first value). Where x is duplicated within a series, the first occurrence is used.
+    :return:        2-D float array of shape (n_x, 1 + n_series), the first column is the union x, followed by one
+                    column per series.
+    """
+    list_x = [np.asarray(x, dtype=np.float64) for x in list_x]
+    x_all = np.unique(np.concatenate(list_x)) if list_x else np.empty(0)
+    is_ffill = isinstance(fill, str)
+    if is_ffill and fill != 'ffill':
+        raise ValueError(f'Unknown fill `{fill}`')
+
+    aligned = np.full((len(x_all), 1 + len(list_x)), np.nan if is_ffill else fill, dtype=np.float64)
+    aligned[:, 0] = x_all
+    for i, (x, y) in enumerate(zip(list_x, list_y)):
+        if len(x) == 0:
+            continue
+        order = np.argsort(x, kind='stable')
+        x, y = x[order], np.asarray(y, dtype=np.float64)[order]
+        i_x = np.minimum(np.searchsorted(x, x_all), len(x) - 1)
+        is_hit = x[i_x] == x_all
+        if is_ffill:
+            i_hit = np.maximum.accumulate(np.where(is_hit, np.arange(len(x_all)), -1))
+            is_hit = i_hit >= 0
+            i_x = i_x[i_hit[is_hit]]
+            aligned[is_hit, i + 1] = y[i_x]
+        else:
+            aligned[is_hit, i + 1] = y[i_x[is_hit]]
+    return aligned
+
+
+STRAIN_EXCEEDANCE_COLUMNS = dict(
+    shell='%10d',
+    peak_strain='%12.7f',
+    peak_strain_time='%10g',
+    peak_strain_surf='%10d',
+    peak_strain_rebar='%10d',
+    peak_strain2='%12.7f',
+    peak_strain2_time='%10g',
+    time_exceed_strain='%10g',
+    time_exceed_strain2='%10g',
+)
+
+
+def make_strain_exceedance(
+        list_time,
+        list_shell,
+        list_surf,
+        list_rebar,
+        list_strain,
+        list_strain2,
+        threshold_strain: float = None,
+        threshold_strain2: float = None,
+        index: dict = None,
+) -> dict:
+    """Scan strain of every shell in one vectorised pass, over all surf/rebar of the shell.
+
+    Peak strain and stress related strain are the signed values with the largest magnitude, missing values (-1) are
+    ignored. When all values of a shell are missing, its peak is nan, with nan time and -1 surf and rebar. The time of
+    the first exceedance is the earliest time at which the magnitude reaches the threshold, nan if never or the
+    threshold is not provided. The resulting dict, with keys of `STRAIN_EXCEEDANCE_COLUMNS`, contains one row per shell
+    ranked by the magnitude of `peak_strain` in descending order.
+    """
+    if index is None:
+        index = make_strain_index(list_shell, list_surf, list_rebar)
+    order = index['order']
+    if len(order) == 0:
+        return {k: np.empty(0) for k in STRAIN_EXCEEDANCE_COLUMNS}
+
+    # record offsets of every shell in sorted order
+    starts = index['group_offsets'][index['shell_offsets'][:-1]]
+    positions = np.arange(len(order))
+    time = np.asarray(list_time)[order]
+
+    def peak(v):
+        v = np.asarray(v)[order]
+        v_abs = np.where(v == -1, -np.inf, np.abs(v))
+        v_abs_max = np.maximum.reduceat(v_abs, starts)
+        is_peak = v_abs == np.repeat(v_abs_max, np.diff(np.append(starts, len(order))))
+        i_peak = np.minimum.reduceat(np.where(is_peak, positions, len(order)), starts)
+        is_found = np.isfinite(v_abs_max)
+        v_peak = np.where(is_found, v[i_peak], np.nan)
+        return v_abs, v_peak, i_peak, is_found
+
+    def time_exceed(v_abs, threshold):
+        if threshold is None:
+            return np.full(len(starts), np.nan)
+        t = np.minimum.reduceat(np.where(v_abs >= abs(threshold), time, np.inf), starts)
+        return np.where(np.isfinite(t), t, np.nan)
+
+    strain_abs, peak_strain, i_peak_strain, is_strain = peak(list_strain)
+    strain2_abs, peak_strain2, i_peak_strain2, is_strain2 = peak(list_strain2)
+
+    table = dict(
+        shell=index['unique_shell'],
+        peak_strain=peak_strain,
+        peak_strain_time=np.where(is_strain, time[i_peak_strain], np.nan),
+        peak_strain_surf=np.where(is_strain, np.asarray(list_surf)[order[i_peak_strain]], -1),
+        peak_strain_rebar=np.where(is_strain, np.asarray(list_rebar)[order[i_peak_strain]], -1),
+        peak_strain2=peak_strain2,
+        peak_strain2_time=np.where(is_strain2, time[i_peak_strain2], np.nan),
+        time_exceed_strain=time_exceed(strain_abs, threshold_strain),
+        time_exceed_strain2=time_exceed(strain2_abs, threshold_strain2),
+    )
+
+    rank = np.argsort(-np.nan_to_num(np.abs(peak_strain), nan=-1), kind='stable')
+    return {k: v[rank] for k, v in table.items()}
+
+
+def save_strain_exceedance_csv(fp: str, table: dict):
+    """Save the table made by `make_strain_exceedance` as *.csv."""
+    np.savetxt(
+        fp, np.column_stack([table[k] for k in STRAIN_EXCEEDANCE_COLUMNS]), delimiter=',',
+        header=','.join(STRAIN_EXCEEDANCE_COLUMNS.keys()), fmt=list(STRAIN_EXCEEDANCE_COLUMNS.values())
+    )
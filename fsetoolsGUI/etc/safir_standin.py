@@ -0,0 +1,165 @@
+"""A stand-in for the Safir executable to test and benchmark the batch runner without a Safir licence.
+
+It follows the same command line contract as Safir, i.e. `<exe> <name>` run in the directory of `<name>.in`, writes
+progress to stdout and a synthetic `<name>.out` with strain records in the same format as
+`fsetoolsGUI.etc.safir_benchmark.make_synthetic_out`. It imports nothing but the standard library, so that it starts
+as quickly as a native executable. Its behaviour is configured by environment variables, which are
+inherited by the processes started by the batch runner:
+
+    SAFIR_STANDIN_DURATION      seconds to run, or `min,max` for a uniformly random duration [default: 1].
+    SAFIR_STANDIN_CPU           fraction of the duration spent burning CPU rather than sleeping [default: 0].
+    SAFIR_STANDIN_FAIL_RATE     probability to exit with code 1 half way through, leaving a partial *.out [default: 0].
+    SAFIR_STANDIN_HANG_RATE     probability to never exit, until killed, e.g. at timeout [default: 0].
+    SAFIR_STANDIN_N_SHELL       number of shells in the *.out [default: 10].
+    SAFIR_STANDIN_N_TIME        number of time steps in the *.out [default: 5].
+    SAFIR_STANDIN_SEED          makes the behaviour of every job reproducible, by job directory and name.
+
+Use `write_standin_exe` to make an executable to be used as the Safir executable of the batch runner.
+"""
+
+import os
+import random
+import stat
+import sys
+import time
+
+ENV_PREFIX = 'SAFIR_STANDIN_'
+
+
+def get_config(environ: dict = None) -> dict:
+    """Read the stand-in configuration from `environ`, `os.environ` by default, see the module docstring."""
+    environ = os.environ if environ is None else environ
+
+    def get(key: str, default: str) -> str:
+        return environ.get(ENV_PREFIX + key, default)
+
+    duration = [float(i) for i in get('DURATION', '1').split(',')]
+    return dict(
+        duration=(duration[0], duration[-1]),
+        cpu=min(max(float(get('CPU', '0')), 0.), 1.),
+        fail_rate=float(get('FAIL_RATE', '0')),
+        hang_rate=float(get('HANG_RATE', '0')),
+        n_shell=int(get('N_SHELL', '10')),
+        n_time=int(get('N_TIME', '5')),
+        seed=get('SEED', None),
+    )
+
+
+def make_environ(
+        duration=1., cpu: float = 0., fail_rate: float = 0., hang_rate: float = 0., n_shell: int = 10, n_time: int = 5,
+        seed=None
+) -> dict:
+    """Make the environment variables of a stand-in configuration, to update `os.environ` or a copy of it with.
+
+    :param duration:    seconds, or (min, max) seconds for a uniformly random duration.
+    """
+    if isinstance(duration, (tuple, list)):
+        duration = ','.join(str(float(i)) for i in duration)
+    environ = dict(
+        DURATION=str(duration), CPU=str(cpu), FAIL_RATE=str(fail_rate), HANG_RATE=str(hang_rate),
+        N_SHELL=str(n_shell), N_TIME=str(n_time),
+    )
+    if seed is not None:
+        environ['SEED'] = str(seed)
+    return {ENV_PREFIX + k: v for k, v in environ.items()}
+
+
+def write_standin_exe(dir_out: str) -> str:
+    """Write a Python script running this stand-in into `dir_out`, to be used as the Safir executable, e.g. by
+    `fsetoolsGUI.etc.safir_batch.make_jobs`, which runs *.py executables with the current Python interpreter. The job
+    process is therefore the stand-in itself, rather than a shell or cmd.exe, and is killed at timeout.
+
+    :return:    file path of the script.
+    """
+    dir_package = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+    fp = os.path.join(dir_out, 'safir_standin.py')
+    content = (
+        f'#!{sys.executable}\n'
+        'import sys\n'
+        f'sys.path.insert(0, {dir_package!r})\n'
+        'from fsetoolsGUI.etc.safir_standin import main\n'
+        'sys.exit(main())\n'
+    )
+    with open(fp, 'w') as f:
+        f.write(content)
+    os.chmod(fp, os.stat(fp).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return fp
+
+
+def _run_for(seconds: float, cpu: float):
+    """Run for `seconds`, burning CPU for the `cpu` fraction of every 0.1 s and sleeping for the rest."""
+    t_end = time.perf_counter() + seconds
+    while True:
+        now = time.perf_counter()
+        if now >= t_end:
+            return
+        t_slice = min(0.1, t_end - now)
+        t_busy = now + t_slice * cpu
+        while time.perf_counter() < t_busy:
+            pass
+        time.sleep(max(t_slice * (1 - cpu), 0.))
+
+
+def write_out(fp: str, n_shell: int, n_time: int, rng: random.Random, n_surf: int = 2, n_rebar: int = 2):
+    """Write a synthetic Safir *.out file with strain records of `n_shell` x `n_surf` x `n_rebar` at every one of
+    `n_time` time steps, see `fsetoolsGUI.etc.safir_benchmark.make_synthetic_out`."""
+    row_fmt = '  SHELL:%6d  SURF:%3d  REBAR:%3d  Total strain: %13.7E  Stress related strain: %13.7E\n'
+    row_fmt_node = ' NODE:%6d  DISPLACEMENT: %13.7E %13.7E %13.7E\n'
+    n_node = max(n_shell // 4, 1)
+
+    with open(fp, 'w') as f:
+        f.write(' SAFIR synthetic output\n NUMBER OF SHELLS %d\n' % n_shell)
+        for i_time in range(n_time):
+            sigma = 1e-3 * (i_time + 1) / n_time
+            f.write(f'\n      TIME =  {(i_time + 1) * 60.:12.4f} SECONDS\n\n')
+            f.writelines(row_fmt_node % (i + 1, *(rng.gauss(0, 1e-2) for _ in range(3))) for i in range(n_node))
+            f.writelines(
+                row_fmt % (shell, surf, rebar, rng.gauss(0, sigma), rng.gauss(0, sigma))
+                for shell in range(1, n_shell + 1) for surf in range(1, n_surf + 1) for rebar in range(1, n_rebar + 1)
+            )
+
+
+def run(name: str, config: dict = None) -> int:
+    """Run a stand-in job of `<name>.in` in the current directory.
+
+    :return:    exit code, 0 if completed.
+    """
+    config = get_config() if config is None else config
+    print(f' SAFIR stand-in, {name}.in', flush=True)
+    if not os.path.isfile(f'{name}.in'):
+        print(f' ERROR, input file {name}.in not found', flush=True)
+        return 1
+
+    rng = random.Random(None if config['seed'] is None else f'{config["seed"]}:{os.getcwd()}:{name}')
+    duration = rng.uniform(*config['duration'])
+    u = rng.random()
+    is_hang = u < config['hang_rate']
+    is_fail = not is_hang and u < config['hang_rate'] + config['fail_rate']
+
+    n_time = max(config['n_time'], 1)
+    for i_time in range(n_time):
+        _run_for(duration / n_time, config['cpu'])
+        print(f'      TIME = {(i_time + 1) * 60:12.4f} SECONDS', flush=True)
+        if is_hang and i_time >= n_time // 2:
+            while True:
+                time.sleep(1)
+        if is_fail and i_time >= n_time // 2:
+            write_out(f'{name}.out', config['n_shell'], i_time + 1, rng)
+            print(' ERROR, stand-in failure', flush=True)
+            return 1
+
+    write_out(f'{name}.out', config['n_shell'], n_time, rng)
+    print(' NORMAL END OF CALCULATION', flush=True)
+    return 0
+
+
+def main(args: list = None) -> int:
+    args = sys.argv[1:] if args is None else args
+    if len(args) != 1:
+        print('Usage: safir_standin <name>, where <name>.in is in the current directory', file=sys.stderr)
+        return 2
+    return run(args[0])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
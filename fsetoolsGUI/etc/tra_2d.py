@@ -0,0 +1,524 @@
+import copy
+import logging
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+from fsetools.lib.fse_thermal_radiation_2d_parallel import main as tra_main
+
+logger = logging.getLogger('gui')
+
+FIGURE_LEVELS = (0, 12.6, 20, 40, 60, 80, 200)
+
+
+def make_grid_axis(v1: float, v2: float, delta: float) -> np.ndarray:
+    """Grid coordinates from `v1` to `v2` inclusive at `delta` interval, the same as the grid of `tra_main`."""
+    return np.arange(v1, v2 + 0.5 * delta, delta)
+
+
+def split_domain(param_dict: dict, n_tiles: int) -> list:
+    """Split the solver domain of `param_dict` into at most `n_tiles` bands of whole grid rows along y, which add up to
+    the grid of the whole domain.
+
+    :return:    list of parameter dicts, the same as `param_dict` but with the domain of each band.
+    """
+    y1, y2 = param_dict['solver_domain']['y']
+    delta = param_dict['solver_delta']
+    n_y = len(make_grid_axis(y1, y2, delta))
+
+    tiles = list()
+    for rows in np.array_split(np.arange(n_y), max(min(n_tiles, n_y), 1)):
+        tile = copy.deepcopy(param_dict)
+        tile['solver_domain']['y'] = (y1 + rows[0] * delta, y1 + rows[-1] * delta)
+        tiles.append(tile)
+    return tiles
+
+
+def to_dense(heat_flux_dict: dict) -> tuple:
+    """Convert `heat_flux_dict` of `tra_main`, keyed by z as text, into z-planes in ascending order.
+
+    :return:    (z of the planes in shape (nz,), heat flux in a contiguous array of shape (nz, ny, nx)).
+    """
+    keys = sorted(heat_flux_dict, key=float)
+    return (
+        np.array([float(k) for k in keys]),
+        np.ascontiguousarray(np.stack([np.atleast_2d(heat_flux_dict[k]) for k in keys]), dtype=float),
+    )
+
+
+def make_result(param_dict: dict, heat_flux_z: np.ndarray, heat_flux_3d: np.ndarray) -> dict:
+    """
+    :return:    `param_dict` with heat flux of every z-plane `heat_flux_3d`, in shape (nz, ny, nx), z of the planes
+                `heat_flux_z`, the envelope over all planes `heat_flux_max` and the plane to be plotted `heat_flux`,
+                which is the envelope.
+    """
+    result = copy.deepcopy(param_dict)
+    result['heat_flux_z'] = heat_flux_z
+    result['heat_flux_3d'] = heat_flux_3d
+    result['heat_flux_max'] = np.max(heat_flux_3d, axis=0)
+    result['heat_flux'] = result['heat_flux_max']
+    return result
+
+
+def z_plane_index(heat_flux_z: np.ndarray, z: float) -> int:
+    """Index of the z-plane nearest to `z`, worked out directly when planes are evenly spaced."""
+    n = len(heat_flux_z)
+    if n == 1:
+        return 0
+    step = (heat_flux_z[-1] - heat_flux_z[0]) / (n - 1)
+    i = min(max(int(round((z - heat_flux_z[0]) / step)), 0), n - 1)
+    if abs(heat_flux_z[i] - z) <= 0.5 * step:
+        return i
+    # unevenly spaced planes
+    i = min(max(int(np.searchsorted(heat_flux_z, z)), 1), n - 1)
+    return i if abs(heat_flux_z[i] - z) < abs(heat_flux_z[i - 1] - z) else i - 1
+
+
+def solve_tile(param_dict: dict) -> tuple:
+    """Solve one band made by `split_domain`, executed in a worker process.
+
+    :return:    z-planes of the band, see `to_dense`.
+    """
+    return to_dense(tra_main(param_dict)['heat_flux_dict'])
+
+
+def merge_tiles(param_dict: dict, results: list) -> dict:
+    """Stack the results of bands, in the order made by `split_domain`, into the result of the whole domain.
+
+    :return:    see `make_result`.
+    """
+    return make_result(param_dict, results[0][0], np.concatenate([i[1] for i in results], axis=1))
+
+
+def solve_many(
+        list_param_dict: list,
+        n_proc: int = None,
+        n_tiles: int = None,
+        progress_callback=None,
+        stop_event=None,
+        poll_interval: float = 0.05,
+):
+    """Solve the heat flux contour of every one of `list_param_dict`, see `tra_main`, with the solver domain split into
+    bands of grid rows, see `split_domain`. Bands of all parameter dicts are solved by one pool of processes, so that
+    the grid computation is not limited to one core by the GIL.
+
+    :param n_proc:              number of processes, number of CPUs by default. Bands are solved in the current
+                                process when 1.
+    :param n_tiles:             number of bands of each parameter dict, 4 times `n_proc` by default so that the
+                                processes are kept busy and progress is reported often.
+    :param progress_callback:   called with the percentage of bands solved, e.g. a Qt signal `emit`.
+    :param stop_event:          `threading.Event`, the pool is terminated and None is returned promptly once it is set.
+    :return:                    list of results, see `merge_tiles`, None if stopped.
+    """
+    n_proc = max(n_proc or os.cpu_count() or 1, 1)
+    tiles = [(i, tile) for i, param_dict in enumerate(list_param_dict) for tile in split_domain(
+        param_dict, n_tiles or n_proc * 4
+    )]
+    results = [None] * len(tiles)
+
+    def progress():
+        if progress_callback is not None:
+            progress_callback(int(100 * sum(i is not None for i in results) / max(len(results), 1)))
+
+    def merge():
+        return [
+            merge_tiles(param_dict, [v for (j, _), v in zip(tiles, results) if j == i])
+            for i, param_dict in enumerate(list_param_dict)
+        ]
+
+    if n_proc == 1 or len(tiles) <= 1:
+        for i, (_, tile) in enumerate(tiles):
+            if stop_event is not None and stop_event.is_set():
+                return None
+            results[i] = solve_tile(tile)
+            progress()
+        return merge()
+
+    with multiprocessing.Pool(min(n_proc, len(tiles))) as pool:
+        pending = {i: pool.apply_async(solve_tile, (tile,)) for i, (_, tile) in enumerate(tiles)}
+        while pending:
+            if stop_event is not None and stop_event.is_set():
+                # leaving the context terminates the workers, outstanding bands are discarded
+                logger.info(f'TRA 2D solver cancelled with {len(pending)} of {len(tiles)} bands outstanding')
+                return None
+            for i in [i for i, v in pending.items() if v.ready()]:
+                results[i] = pending.pop(i).get()
+                progress()
+            time.sleep(poll_interval)
+
+    return merge()
+
+
+def solve(param_dict: dict, **kwargs):
+    """Solve the heat flux contour of `param_dict` on a pool of processes, see `solve_many`.
+
+    :return:    see `merge_tiles`, None if stopped.
+    """
+    results = solve_many([param_dict], **kwargs)
+    return None if results is None else results[0]
+
+
+def emitter_key(emitter: dict, param_dict: dict, z: float) -> tuple:
+    """Key of the unit heat flux field of `emitter` in z-plane `z`, i.e. its geometry, the plane, and the domain and delta
+    of `param_dict`."""
+
+    def to_tuple(v):
+        return tuple(float(i) for i in v)
+
+    domain = param_dict['solver_domain']
+    return (
+        to_tuple(emitter['x']), to_tuple(emitter['y']), to_tuple(emitter['z']), z_plane_key(z),
+        to_tuple(domain['x']), to_tuple(domain['y']), float(param_dict['solver_delta']),
+    )
+
+
+def z_plane_key(z: float) -> float:
+    """z of a plane as keyed by `tra_main`, i.e. to 3 decimal places."""
+    return float(f'{z:.3f}')
+
+
+class UnitFieldCache:
+    """Cache of the heat flux field of every emitter at unit heat flux in every z-plane, see `emitter_key`.
+
+    Heat flux of emitters adds up, the result is therefore the sum of the cached unit fields weighted by the heat flux
+    of the emitters. Changing the heat flux of an emitter only rescales, and changing the geometry of one emitter only
+    solves that emitter. Unit fields are solved in the z-planes of the whole model, see `make_z_planes`, one plane at a
+    time, so that they add up whichever emitters are solved together.
+    """
+
+    def __init__(self, max_size: int = 256):
+        """
+        :param max_size:    number of unit fields, of one emitter in one z-plane, kept, the least recently used are
+                            dropped first.
+        """
+        self.max_size = max_size
+        self.__fields = OrderedDict()
+
+    def __len__(self):
+        return len(self.__fields)
+
+    def clear(self):
+        self.__fields.clear()
+
+    def solve(self, param_dict: dict, **kwargs):
+        """Solve `param_dict`, the same as `solve`, with unit fields not in the cache solved together on one pool of
+        processes.
+
+        :param kwargs:  passed to `solve_many`.
+        :return:        see `merge_tiles`, None if stopped.
+        """
+        if len(param_dict['emitter_list']) == 0:
+            return solve(param_dict, **kwargs)
+
+        z = make_z_planes(param_dict)
+        keys = [[emitter_key(emitter, param_dict, i) for i in z] for emitter in param_dict['emitter_list']]
+
+        missing = OrderedDict()
+        for emitter, keys_emitter in zip(param_dict['emitter_list'], keys):
+            for i, k in zip(z, keys_emitter):
+                if k not in self.__fields and k not in missing:
+                    param_dict_unit = copy.deepcopy(param_dict)
+                    param_dict_unit['emitter_list'] = [dict(emitter, heat_flux=1.)]
+                    param_dict_unit['solver_domain']['z'] = [float(i)]
+                    missing[k] = param_dict_unit
+        if missing:
+            # about as many bands in total as `solve` would split the whole model into
+            n_proc = max(kwargs.get('n_proc') or os.cpu_count() or 1, 1)
+            kwargs.setdefault('n_tiles', max(-(-4 * n_proc // len(missing)), 1))
+            results = solve_many(list(missing.values()), **kwargs)
+            if results is None:
+                return None
+            for k, result in zip(missing, results):
+                self.__fields[k] = result['heat_flux_3d'][0]
+            logger.info(f'TRA 2D unit fields of {len(missing)} of {len(z) * len(keys)} emitter z-planes solved')
+        elif kwargs.get('progress_callback') is not None:
+            kwargs['progress_callback'](100)
+
+        heat_flux_3d = np.zeros((len(z),) + self.__fields[keys[0][0]].shape)
+        for emitter, keys_emitter in zip(param_dict['emitter_list'], keys):
+            for i, k in enumerate(keys_emitter):
+                heat_flux_3d[i] += self.__fields[k] * emitter['heat_flux']
+                self.__fields.move_to_end(k)
+        while len(self.__fields) > max(self.max_size, len(z) * len(keys)):
+            self.__fields.popitem(last=False)
+        return make_result(param_dict, np.array([z_plane_key(i) for i in z]), heat_flux_3d)
+
+
+def phi_parallel_corner(a: np.ndarray, b: np.ndarray, s: np.ndarray) -> np.ndarray:
+    """View factor from a point to a parallel rectangle of `a` by `b` with a corner at the foot of the normal from the
+    point, `s` away. Signed by `a` and `b`, so that view factors of rectangles sharing the corner add up."""
+    a, b = a / s, b / s
+    a_, b_ = np.sqrt(1 + a * a), np.sqrt(1 + b * b)
+    return (a / a_ * np.arctan(b / a_) + b / b_ * np.arctan(a / b_)) / (2 * np.pi)
+
+
+def phi_parallel(emitter: dict, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> np.ndarray:
+    """View factor from points (`x`, `y`, `z`) to a vertical rectangular `emitter`, the same as `solver_phi_2d` of
+    `tra_main`. Inputs are broadcast against each other.
+
+    As by `tra_main`, the emitter spans from 0 to its height `abs(z2 - z1)` whatever its `z`, i.e. `z` of points is
+    their height above the bottom of the emitter. The emitter radiates from its front only, to the left of the
+    direction from its first to its second plan end point, view factor is zero on and behind its plane.
+    """
+    (x1, x2), (y1, y2), (z1, z2) = emitter['x'], emitter['y'], emitter['z']
+    # end points nudged apart as by `tra_main`
+    x2 = x2 + 1e-9 if x1 == x2 else x2
+    y2 = y2 + 1e-9 if y1 == y2 else y2
+    width, height = ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5, abs(z1 - z2)
+
+    # rotated so that the emitter is along x, `u` along and `s` in front of the emitter
+    theta = np.arctan2(y2 - y1, x2 - x1) % (2 * np.pi)
+    cos, sin = np.cos(theta), np.sin(theta)
+    u_centre = 0.5 * ((cos * x1 + sin * y1) + (cos * x2 + sin * y2))
+    s = (-sin * x + cos * y) - (-sin * x1 + cos * y1)
+    is_front = s > 0
+    s = np.where(is_front, s, 1.)
+
+    # the emitter is symmetric about its centre, points are mirrored to its far half as by `tra_main`
+    w = 0.5 * width + np.abs(u_centre - (cos * x + sin * y))
+    a1, a2, b1, b2 = -w, width - w, -z, height - z
+    phi = (
+            phi_parallel_corner(a2, b2, s) - phi_parallel_corner(a1, b2, s)
+            - phi_parallel_corner(a2, b1, s) + phi_parallel_corner(a1, b1, s)
+    )
+    return np.where(is_front, phi, 0.)
+
+
+def heat_flux_at(emitter_list: list, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> np.ndarray:
+    """Heat flux of all emitters at points (`x`, `y`, `z`), broadcast against each other, see `phi_parallel`."""
+    heat_flux = 0.
+    for emitter in emitter_list:
+        heat_flux = heat_flux + emitter['heat_flux'] * phi_parallel(emitter, x, y, z)
+    return heat_flux
+
+
+def make_z_planes(param_dict: dict) -> np.ndarray:
+    """z-planes solved by `tra_main` for `param_dict`. `solver_domain['z']` of 2 values is from the first to the second
+    at 0.5 interval and of 1 value is the plane. When not provided, z-planes are from the lowest to the highest emitter
+    at `solver_delta` interval."""
+    z = param_dict['solver_domain'].get('z')
+    if z is not None and len(z) > 0:
+        if len(z) == 2:
+            return np.arange(z[0], z[1] + 0.25, 0.5)
+        if len(z) == 1:
+            return np.asarray(z, dtype=float)
+        raise ValueError('solver_domain:z length can only be 1 or 2.')
+    z1 = min(min(i['z']) for i in param_dict['emitter_list'])
+    z2 = max(max(i['z']) for i in param_dict['emitter_list'])
+    return np.arange(z1, z2 + 0.5 * param_dict['solver_delta'], param_dict['solver_delta'])
+
+
+def solve_adaptive(
+        param_dict: dict,
+        levels: tuple = FIGURE_LEVELS,
+        n_refine: int = 4,
+        progress_callback=None,
+        stop_event=None,
+):
+    """Solve the heat flux contour of `param_dict` by adaptive refinement, evaluating `heat_flux_at` only where needed
+    to resolve the contour `levels`.
+
+    The grid of `solver_delta` is first evaluated every 2 ** `n_refine` points. Cells are halved recursively where the
+    heat flux at their corners crosses any of `levels`, in any z-plane, or where they are next to an emitter. Other
+    cells are bilinearly interpolated from their corners. Contour lines are therefore the same as of the full grid,
+    while large areas far from any level are evaluated coarsely.
+
+    :param levels:              heat flux contour levels, e.g. figure levels and the critical heat flux.
+    :param progress_callback:   called with the percentage of refinement levels completed.
+    :param stop_event:          `threading.Event`, None is returned once it is set.
+    :return:                    see `make_result`, with the fraction of grid points evaluated `n_evaluated`.
+    """
+    delta = param_dict['solver_delta']
+    x1, y1 = param_dict['solver_domain']['x'][0], param_dict['solver_domain']['y'][0]
+    nx = len(make_grid_axis(*param_dict['solver_domain']['x'], delta))
+    ny = len(make_grid_axis(*param_dict['solver_domain']['y'], delta))
+    z = make_z_planes(param_dict)
+    levels = np.asarray(sorted(i for i in set(levels) if i > 0), dtype=float)
+
+    # grid extended to whole coarse cells
+    step = 2 ** max(n_refine, 0)
+    nx_, ny_ = -(-(nx - 1) // step) * step + 1, -(-(ny - 1) // step) * step + 1
+    values = np.zeros((len(z), ny_, nx_))
+    is_evaluated = np.zeros((ny_, nx_), dtype=bool)
+
+    def evaluate(i: np.ndarray, j: np.ndarray):
+        k = np.unique(i * nx_ + j)
+        i, j = np.divmod(k[~is_evaluated.ravel()[k]], nx_)
+        values[:, i, j] = heat_flux_at(param_dict['emitter_list'], x1 + j * delta, y1 + i * delta, z[:, np.newaxis])
+        is_evaluated[i, j] = True
+
+    i, j = (v.ravel() for v in np.meshgrid(np.arange(0, ny_, step), np.arange(0, nx_, step), indexing='ij'))
+    evaluate(i, j)
+    i, j = (v.ravel() for v in np.meshgrid(np.arange(0, ny_ - 1, step), np.arange(0, nx_ - 1, step), indexing='ij'))
+
+    n_level = max(n_refine, 0)
+    while step > 1 and len(i) > 0:
+        if stop_event is not None and stop_event.is_set():
+            return None
+
+        corners = np.stack([values[:, i, j], values[:, i, j + step], values[:, i + step, j],
+                            values[:, i + step, j + step]], axis=-1)
+        v_min, v_max = corners.min(axis=-1)[..., np.newaxis], corners.max(axis=-1)[..., np.newaxis]
+        is_refine = np.any((v_min <= levels) & (v_max >= levels) & (v_min < v_max), axis=(0, 2))
+
+        # cells next to emitters, where heat flux peaks between corners
+        xc, yc = x1 + (j + 0.5 * step) * delta, y1 + (i + 0.5 * step) * delta
+        for emitter in param_dict['emitter_list']:
+            (ex1, ex2), (ey1, ey2) = emitter['x'], emitter['y']
+            ex, ey = ex2 - ex1, ey2 - ey1
+            t = np.clip(((xc - ex1) * ex + (yc - ey1) * ey) / max(ex * ex + ey * ey, 1e-12), 0, 1)
+            is_refine |= np.hypot(xc - ex1 - t * ex, yc - ey1 - t * ey) <= step * delta
+
+        # interpolate cells not to be refined, points evaluated by neighbouring cells are kept
+        k = ~is_refine
+        if np.any(k):
+            t = np.arange(step + 1) / step
+            ii = i[k][:, np.newaxis, np.newaxis] + np.arange(step + 1)[:, np.newaxis]
+            jj = j[k][:, np.newaxis, np.newaxis] + np.arange(step + 1)
+            ii, jj = np.broadcast_arrays(ii, jj)
+            c = corners[:, k, np.newaxis, np.newaxis, :]
+            v = (c[..., 0] * (1 - t[:, np.newaxis]) * (1 - t) + c[..., 1] * (1 - t[:, np.newaxis]) * t
+                 + c[..., 2] * t[:, np.newaxis] * (1 - t) + c[..., 3] * t[:, np.newaxis] * t)
+            is_free = ~is_evaluated[ii, jj]
+            values[:, ii[is_free], jj[is_free]] = v[:, is_free]
+
+        # halve cells to be refined
+        i, j, step = i[is_refine], j[is_refine], step // 2
+        evaluate(
+            np.concatenate([i + step, i, i + step, i + 2 * step, i + step]),
+            np.concatenate([j, j + step, j + step, j + step, j + 2 * step]),
+        )
+        i = np.concatenate([i, i + step, i, i + step])
+        j = np.concatenate([j, j, j + step, j + step])
+
+        if progress_callback is not None:
+            progress_callback(int(100 * (1 - np.log2(step) / n_level)) if n_level else 100)
+
+    if progress_callback is not None:
+        progress_callback(100)
+
+    result = make_result(param_dict, z, np.ascontiguousarray(values[:, :ny, :nx]))
+    result['n_evaluated'] = np.count_nonzero(is_evaluated[:ny, :nx]) / (nx * ny)
+    return result
+
+
+def solve_receivers(param_dict: dict, spacing: float = None, critical_heat_flux: float = 12.6) -> list:
+    """Evaluate heat flux only along the receiver lines of `param_dict['receiver_list']`, sampled at `spacing`,
+    `solver_delta` by default, in all z-planes, see `make_z_planes`.
+
+    :return:    list of dict of every receiver, with its `name`, sample points `x`, `y`, heat flux envelope over
+                z-planes at the points `heat_flux`, the peak heat flux `peak_heat_flux` at `peak_x`, `peak_y`, `peak_z`
+                and whether the peak is no more than `critical_heat_flux` `is_pass`.
+    """
+    spacing = param_dict['solver_delta'] if spacing is None else spacing
+    z = make_z_planes(param_dict)
+
+    results = list()
+    for receiver in param_dict['receiver_list']:
+        (x1, x2), (y1, y2) = receiver['x'], receiver['y']
+        n = max(int(np.ceil(np.hypot(x2 - x1, y2 - y1) / spacing)), 1) + 1
+        x, y = np.linspace(x1, x2, n), np.linspace(y1, y2, n)
+        heat_flux = heat_flux_at(param_dict['emitter_list'], x, y, z[:, np.newaxis]) * np.ones((len(z), n))
+        i_z, i = np.unravel_index(np.argmax(heat_flux), heat_flux.shape)
+        results.append(dict(
+            name=receiver.get('name', ''),
+            x=x,
+            y=y,
+            heat_flux=np.max(heat_flux, axis=0),
+            peak_heat_flux=heat_flux[i_z, i],
+            peak_x=x[i],
+            peak_y=y[i],
+            peak_z=z[i_z],
+            is_pass=bool(heat_flux[i_z, i] <= critical_heat_flux),
+        ))
+    return results
+
+
+def _test_param_dicts() -> list:
+    """The example model of the TRA 2D app, and emitters of all directions with the domain around them."""
+    return [
+        dict(
+            emitter_list=[
+                dict(name='facade 1', x=[0, 5], y=[0, 0], z=[0, 3], heat_flux=168),
+                dict(name='facade 2', x=[5, 10], y=[0, 0], z=[0, 3], heat_flux=84),
+            ],
+            receiver_list=[dict(name='wall 1', x=[0, 10], y=[10, 10]), dict(name='wall 2', x=[-5, 15], y=[2, 2])],
+            solver_domain=dict(x=(-5, 15), y=(0, 15), z=None),
+            solver_delta=.5,
+        ),
+        dict(
+            emitter_list=[
+                dict(x=[2, -3], y=[1, 4], z=[1, 4.2], heat_flux=100),
+                dict(x=[4, 4], y=[-2, 3], z=[0.5, 2], heat_flux=50),
+                dict(x=[-4, 1], y=[-3, -3], z=[2, 0], heat_flux=70),
+            ],
+            receiver_list=[dict(x=[-6, 6], y=[0, 0]), dict(x=[-2, -2], y=[-5, 6])],
+            solver_domain=dict(x=(-6, 6), y=(-5, 6), z=None),
+            solver_delta=.25,
+        ),
+    ]
+
+
+def test_make_z_planes():
+    for param_dict in _test_param_dicts():
+        for z in (None, [], [1.2], [0.5, 2]):
+            param_dict['solver_domain']['z'] = z
+            z_tra_main, _ = to_dense(tra_main(copy.deepcopy(param_dict))['heat_flux_dict'])
+            assert np.allclose(make_z_planes(param_dict), z_tra_main, rtol=0, atol=5e-4)
+
+
+def test_solve_receivers():
+    for param_dict in _test_param_dicts():
+        x1, y1 = param_dict['solver_domain']['x'][0], param_dict['solver_domain']['y'][0]
+        delta = param_dict['solver_delta']
+        z, heat_flux_3d = to_dense(tra_main(copy.deepcopy(param_dict))['heat_flux_dict'])
+
+        # receiver lines are along grid points, heat flux at every point is the same as of the grid
+        for receiver in solve_receivers(param_dict):
+            i, j = np.rint((receiver['y'] - y1) / delta).astype(int), np.rint((receiver['x'] - x1) / delta).astype(int)
+            assert np.allclose(receiver['heat_flux'], np.max(heat_flux_3d, axis=0)[i, j], rtol=1e-9, atol=1e-9)
+            assert np.isclose(receiver['peak_heat_flux'], np.max(heat_flux_3d[:, i, j]), rtol=1e-9, atol=1e-9)
+            assert receiver['is_pass'] == (receiver['peak_heat_flux'] <= 12.6)
+
+
+def test_solve_adaptive():
+    levels = [i for i in FIGURE_LEVELS if i > 0]
+    for param_dict in _test_param_dicts():
+        z, heat_flux_3d = to_dense(tra_main(copy.deepcopy(param_dict))['heat_flux_dict'])
+        result = solve_adaptive(param_dict)
+
+        # every grid point is between the same contour levels as of the full grid, in every z-plane
+        assert result['heat_flux_3d'].shape == heat_flux_3d.shape and result['n_evaluated'] < 1
+        assert np.allclose(result['heat_flux_z'], z, rtol=0, atol=5e-4)
+        assert np.array_equal(np.digitize(result['heat_flux_3d'], levels), np.digitize(heat_flux_3d, levels))
+        assert np.array_equal(
+            np.digitize(result['heat_flux_max'], levels), np.digitize(np.max(heat_flux_3d, axis=0), levels)
+        )
+
+
+def test_unit_field_cache():
+    for param_dict in _test_param_dicts():
+        cache = UnitFieldCache()
+
+        def check(param_dict_):
+            z, heat_flux_3d = to_dense(tra_main(copy.deepcopy(param_dict_))['heat_flux_dict'])
+            result = cache.solve(param_dict_, n_proc=1)
+            assert np.allclose(result['heat_flux_z'], z, rtol=0, atol=5e-4)
+            assert np.allclose(result['heat_flux_3d'], heat_flux_3d, rtol=1e-9, atol=1e-9)
+
+        check(param_dict)
+        n_fields = len(cache)
+        assert n_fields == len(param_dict['emitter_list']) * len(make_z_planes(param_dict))
+
+        # heat flux changed, nothing is solved
+        for emitter in param_dict['emitter_list']:
+            emitter['heat_flux'] *= 2
+        check(param_dict)
+        assert len(cache) == n_fields
+
+        # geometry of one emitter changed within the same z-planes, only its unit fields are solved
+        param_dict['emitter_list'][0]['x'] = [i + 0.5 for i in param_dict['emitter_list'][0]['x']]
+        check(param_dict)
+        assert len(cache) == n_fields + len(make_z_planes(param_dict))
@@ -5,9 +5,10 @@ import matplotlib.pyplot as plt
 import numpy as np
 from PySide2 import QtWidgets, QtCore
 from PySide2.QtCore import Slot
-from fsetools.lib.fse_thermal_radiation_2d_parallel import main as tra_main
 from matplotlib import cm
 
+from fsetoolsGUI import logger
+from fsetoolsGUI.etc.tra_2d import FIGURE_LEVELS, UnitFieldCache, solve_adaptive, solve_receivers, z_plane_index
 from fsetoolsGUI.gui.layout.i0406_tra_2d_xy_contour import Ui_MainWindow
 from fsetoolsGUI.gui.logic.c0000_app_template_old import AppBaseClass
 from fsetoolsGUI.gui.logic.custom_table import TableModel
@@ -42,7 +43,7 @@ def tra_main_plot(
     if 'figure_levels' in param_dict:
         figure_levels = param_dict['figure_levels']
     else:
-        figure_levels = (0, 12.6, 20, 40, 60, 80, 200)
+        figure_levels = FIGURE_LEVELS
     figure_levels = list(figure_levels) + [critical_heat_flux]
     figure_levels = tuple(sorted(set(figure_levels)))
 
@@ -128,6 +129,8 @@ class App(AppBaseClass):
         self.figure.patch.set_facecolor('None')
         self.Signals = Signals()
         self.calculation_thread = None
+        self.calculation_stop_event = threading.Event()
+        self.unit_field_cache = UnitFieldCache()
 
         self.ax = self.figure.subplots()
         self.ax.set_xticks([])
@@ -143,6 +146,7 @@ class App(AppBaseClass):
 
         # signals
         self.ui.pushButton_ok.clicked.connect(self.calculate)
+        self.ui.pushButton_cancel.clicked.connect(self.cancel)
         self.ui.pushButton_refresh.clicked.connect(self.update_plot)
         self.ui.pushButton_save_figure.clicked.connect(self.save_figure)
         self.ui.pushButton_example.clicked.connect(self.example)
@@ -212,6 +216,9 @@ class App(AppBaseClass):
 
     def calculate(self):
 
+        if self.ui.checkBox_solver_receivers.isChecked():
+            return self.calculate_receivers()
+
         # check if there are live threads
         # do not start new threads if there
         try:
@@ -225,23 +232,89 @@ class App(AppBaseClass):
         self.ui.checkBox_max_heat_flux.setChecked(True)
         self.ui.doubleSpinBox_graphic_z.setEnabled(False)
 
-        t = threading.Thread(target=self.calculate_worker)
+        self.calculation_stop_event = threading.Event()
+        solver_parameters = self.solver_parameters
+        levels = tuple(solver_parameters.get('figure_levels', FIGURE_LEVELS)) + (
+            self.graphic_parameters['critical_heat_flux'],)
+        t = threading.Thread(
+            target=self.calculate_worker,
+            args=(solver_parameters, self.ui.checkBox_solver_adaptive.isChecked(), levels)
+        )
         self.calculation_thread = t
         t.start()
 
-    def calculate_worker(self):
-        self.solver_results = tra_main(self.solver_parameters,
-                                       QtCore_ProgressSignal=self.Signals.update_progress_bar_signal)
+    def calculate_worker(self, solver_parameters: dict, is_adaptive: bool = False, levels: tuple = FIGURE_LEVELS):
+        try:
+            if is_adaptive:
+                solver_results = solve_adaptive(
+                    solver_parameters,
+                    levels=levels,
+                    progress_callback=self.Signals.update_progress_bar_signal.emit,
+                    stop_event=self.calculation_stop_event
+                )
+            else:
+                solver_results = self.unit_field_cache.solve(
+                    solver_parameters,
+                    progress_callback=self.Signals.update_progress_bar_signal.emit,
+                    stop_event=self.calculation_stop_event
+                )
+        except Exception as e:
+            logger.error(f'Failed to complete calculation, {e}')
+            solver_results = None
+
+        if solver_results is None:
+            self.Signals.update_progress_bar_signal.emit(0)
+            self.Signals.calculation_complete.emit(False)
+            return
+
+        # the envelope is worked out once by the solver, zero is replaced once here for plotting
+        solver_results['heat_flux_max'][solver_results['heat_flux_max'] == 0] = -1
+        self.solver_results = solver_results
         self.Signals.calculation_complete.emit(True)
 
+    def calculate_receivers(self):
+        """heat flux along receiver lines only, sampled at the receiver spacing, or the solver resolution if not
+        provided, which is cheap enough to be solved in the ui thread"""
+        critical_heat_flux = self.graphic_parameters['critical_heat_flux']
+        try:
+            spacing = self.ui.lineEdit_solver_receiver_spacing.text().strip()
+            spacing = float(spacing) if spacing else None
+            if spacing is not None and spacing <= 0:
+                raise ValueError(f'Receiver spacing should be positive, {spacing:g}')
+            receiver_results = solve_receivers(
+                self.solver_parameters, spacing=spacing, critical_heat_flux=critical_heat_flux
+            )
+        except Exception as e:
+            self.statusBar().showMessage(f'Failed to complete calculation, {e}')
+            logger.error(f'Failed to complete calculation, {e}')
+            return
+
+        msg = list()
+        for i in receiver_results:
+            msg.append(
+                f'{i["name"]}: {"PASS" if i["is_pass"] else "FAIL"}, peak {i["peak_heat_flux"]:.1f} kW/m² at '
+                f'x={i["peak_x"]:.2f}, y={i["peak_y"]:.2f}, z={i["peak_z"]:.2f}'
+            )
+            if not self.is_first_plot:
+                self.ax.plot(i['peak_x'], i['peak_y'], marker='x', ms=10, c='r' if not i['is_pass'] else 'k')
+        if not self.is_first_plot:
+            self.figure_canvas.draw()
+        self.statusBar().showMessage(
+            f'{sum(not i["is_pass"] for i in receiver_results)} of {len(receiver_results)} receivers exceed '
+            f'{critical_heat_flux:g} kW/m²'
+        )
+        self.message_box('\n'.join(msg), 'Receiver heat flux')
+
+    def cancel(self):
+        """stop the running calculation, outstanding work in the process pool is discarded"""
+        self.calculation_stop_event.set()
+
     def graphics_max_heat_flux_check(self):
         if self.ui.checkBox_max_heat_flux.isChecked():
             self.ui.doubleSpinBox_graphic_z.setEnabled(False)
             if len(self.solver_results) == 0:
                 return 0  # skip if calculation not yet carried out.
-            heat_flux = np.max(np.array([i for i in self.solver_results['heat_flux_dict'].values()]), axis=0)
-            heat_flux[heat_flux == 0] = -1
-            self.solver_results['heat_flux'] = heat_flux
+            self.solver_results['heat_flux'] = self.solver_results['heat_flux_max']
             self.update_plot()
         else:
             self.ui.doubleSpinBox_graphic_z.setEnabled(True)
@@ -250,10 +323,11 @@ class App(AppBaseClass):
     @Slot(bool)
     def update_plot(self, v: bool = True):
         if v:
-            z_values = [float(i) for i in self.solver_results['heat_flux_dict'].keys()]
-            z_max, z_min = max(z_values), min(z_values)
+            z_values = self.solver_results['heat_flux_z']
+            z_max, z_min = z_values[-1], z_values[0]
             self.ui.doubleSpinBox_graphic_z.setRange(z_min, z_max)
-            self.ui.doubleSpinBox_graphic_z.setSingleStep((z_max - z_min) / (len(z_values) - 1))
+            if len(z_values) > 1:
+                self.ui.doubleSpinBox_graphic_z.setSingleStep((z_max - z_min) / (len(z_values) - 1))
 
             if self.is_first_plot:
                 # tra_main_plot(self.solver_results, ax=self.ax, fig=self.figure, **self.graphic_parameters)
@@ -275,11 +349,9 @@ class App(AppBaseClass):
 
         z = self.ui.doubleSpinBox_graphic_z.value()
 
-        for i, v in self.solver_results['heat_flux_dict'].items():
-            if abs(float(i) - z) < 1e-5:
-                self.solver_results['heat_flux'] = v
-                self.update_plot()
-                break
+        i = z_plane_index(self.solver_results['heat_flux_z'], z)
+        self.solver_results['heat_flux'] = self.solver_results['heat_flux_3d'][i]
+        self.update_plot()
 
     def save_figure(self):
         path_to_file, _ = QtWidgets.QFileDialog.getSaveFileName(
@@ -1,14 +1,14 @@
 import copy
 import os
 import threading
-from os import path
 
 import numpy as np
 from PySide2 import QtWidgets, QtCore
 from PySide2.QtCore import Slot
-from PySide2.QtWidgets import QLabel, QGridLayout, QFileDialog
-from fsetools.etc.safir import safir_batch_run
+from PySide2.QtWidgets import QLabel, QGridLayout, QFileDialog, QCheckBox
 
+from fsetoolsGUI.etc.safir_batch import check_compression
+from fsetoolsGUI.etc.safir_pipeline import run_batch
 from fsetoolsGUI.etc.safir_post_processor import out2pstrain, pstrain2dict, save_csv
 from fsetoolsGUI.gui.logic.c0000_app_template import AppBaseClass, AppBaseClassUISimplified01
 from fsetoolsGUI.gui.logic.c0000_utilities import Counter, ProgressBar
@@ -60,47 +60,80 @@ class App(AppBaseClass):
         self.add_lineedit_set_to_grid(self.ui.p2_layout, c.count, 'p2_in_fp_safir_exe', 'Safir exe file path', 'Select', 150, unit_obj='QPushButton')
         self.add_lineedit_set_to_grid(self.ui.p2_layout, c.count, 'p2_in_n_mp', 'No. of processes', 'Integer')
         self.add_lineedit_set_to_grid(self.ui.p2_layout, c.count, 'p2_in_timeout', 'timeout', 's')
+        self.ui.p2_in_is_adaptive = QCheckBox('Adapt no. of processes to free memory and CPU load?')
+        self.ui.p2_layout.addWidget(self.ui.p2_in_is_adaptive, c.count, 0, 1, 3)
+        self.add_lineedit_set_to_grid(self.ui.p2_layout, c.count, 'p2_in_n_mp_max', 'Max. no. of processes', 'Integer')
+        self.add_lineedit_set_to_grid(self.ui.p2_layout, c.count, 'p2_in_dir_scratch', 'Scratch dir.', 'Select', unit_obj='QPushButton')
+        self.add_lineedit_set_to_grid(self.ui.p2_layout, c.count, 'p2_in_compression', 'Compress *.out', '', obj='QComboBox')
+        self.ui.p2_in_is_post_process = QCheckBox('Post-process strain of *.out as jobs complete?')
+        self.ui.p2_layout.addWidget(self.ui.p2_in_is_post_process, c.count, 0, 1, 3)
 
         # default parameters
         self.ui.p2_in_fp_safir_exe.setText(os.path.join('c:', os.sep, 'work', 'fem', 'SAFIR','safir.exe'))
         self.ui.p2_in_n_mp.setText('2')
         self.ui.p2_in_timeout.setText('1800')
+        self.ui.p2_in_n_mp_max.setText(str(os.cpu_count() or 2))
+        self.ui.p2_in_n_mp_max.setEnabled(False)
+        self.ui.p2_in_dir_scratch.setToolTip('Optional, run every job in a local directory and move outputs back')
+        self.ui.p2_in_compression.addItems(['None', 'gzip', 'zstd'])
 
         # signals and slots
         self.__progress_bar.Signals.progress.connect(self.__progress_bar.update_progress_bar)
         self.ui.p2_in_fp_safir_exe_unit.clicked.connect(
             lambda: self.ui.p2_in_fp_safir_exe.setText(QFileDialog.getOpenFileName(self, 'Select SAFIR executable', self.ui.p2_in_fp_safir_exe.text(), '(*.exe)')[0])
         )
+        self.ui.p2_in_is_adaptive.stateChanged.connect(
+            lambda: self.ui.p2_in_n_mp_max.setEnabled(self.ui.p2_in_is_adaptive.isChecked())
+        )
+        self.ui.p2_in_dir_scratch_unit.clicked.connect(lambda: self.ui.p2_in_dir_scratch.setText(QtWidgets.QFileDialog.getExistingDirectory(self, 'Select scratch folder')))
         self.ui.p2_in_fp_input_root_dir_unit.clicked.connect(lambda: self.ui.p2_in_fp_input_root_dir.setText(QtWidgets.QFileDialog.getExistingDirectory(self, 'Select folder')))
 
     def ok(self):
+        input_parameters = self.input_parameters
+        try:
+            check_compression(input_parameters['compression'])
+        except (ValueError, ModuleNotFoundError) as e:
+            self.message_box(str(e), 'Error')
+            return
         self.__progress_bar.show()
-        self.calculate(**self.input_parameters)
+        self.calculate(**input_parameters)
 
     @staticmethod
-    def calculate(fp_safir_exe, fp_input_root_dir, timeout, n_mp, qt_progress_signal=None):
-        list_fp_in = list()
-        for root, dirs, files in os.walk(fp_input_root_dir):
-            for file_ in files:
-                if file_.endswith('.in'):
-                    list_fp_in.append(path.join(root, file_))
-
-        list_kwargs_in = list()
-        for i in list_fp_in:
-            list_kwargs_in.append(dict(
-                cmd=[fp_safir_exe, path.basename(i).replace('.in', '')],
-                cwd=path.dirname(i),
-                fp_stdout=path.join(path.dirname(i), path.basename(i).replace('.in', '.stdout.txt')),
-                timeout_seconds=timeout,
-            ))
-
+    def calculate(
+            fp_safir_exe, fp_input_root_dir, timeout, n_mp, n_mp_max=None, is_post_process=False, dir_scratch=None,
+            compression=None, qt_progress_signal=None, qt_progress_label_signal=None
+    ):
+        # jobs and their state are recorded in a manifest in `fp_input_root_dir`, jobs completed in a previous run are
+        # skipped and failed or timed-out jobs are retried
+        # when `n_mp_max` is provided, the number of processes adapts between `n_mp` and `n_mp_max`
+        # when `is_post_process`, strain of every completed job is extracted while other jobs are still running and
+        # summarised in `fp_input_root_dir`
+        # when `dir_scratch` is provided, jobs run there and their outputs are moved back, *.out compressed by
+        # `compression`
         kwargs = dict(
-            list_kwargs_in=list_kwargs_in,
+            fp_safir_exe=fp_safir_exe,
+            fp_input_root_dir=fp_input_root_dir,
+            timeout=timeout,
             n_proc=n_mp,
-            dir_work=fp_input_root_dir,
-            qt_progress_signal=qt_progress_signal
+            n_proc_max=n_mp_max,
+            is_post_process=is_post_process,
+            dir_scratch=dir_scratch,
+            compression=compression,
         )
-        t = threading.Thread(target=safir_batch_run, kwargs=kwargs)
+
+        def progress_callback(n_finished: int, n_total: int, eta: float):
+            if qt_progress_signal is not None:
+                qt_progress_signal.emit(int(n_finished / n_total * 100) if n_total else 100)
+            if qt_progress_label_signal is not None:
+                if n_finished >= n_total:
+                    qt_progress_label_signal.emit('Complete')
+                elif eta is None:
+                    qt_progress_label_signal.emit(f'{n_finished}/{n_total}')
+                else:
+                    qt_progress_label_signal.emit(f'{n_finished}/{n_total}, ETA {int(eta // 3600):d}:{int(eta % 3600 // 60):02d}')
+
+        kwargs['progress_callback'] = progress_callback
+        t = threading.Thread(target=run_batch, kwargs=kwargs)
         t.start()
 
     @property
@@ -115,8 +148,13 @@ class App(AppBaseClass):
             fp_safir_exe=self.ui.p2_in_fp_safir_exe.text(),
             n_mp=str2int(self.ui.p2_in_n_mp.text()) if str2int(self.ui.p2_in_n_mp.text()) else 2,
             timeout=str2int(self.ui.p2_in_timeout.text()) if str2int(self.ui.p2_in_n_mp.text()) else 1800,
+            n_mp_max=str2int(self.ui.p2_in_n_mp_max.text()) if self.ui.p2_in_is_adaptive.isChecked() else None,
+            is_post_process=self.ui.p2_in_is_post_process.isChecked(),
+            dir_scratch=self.ui.p2_in_dir_scratch.text() or None,
+            compression=None if self.ui.p2_in_compression.currentText() == 'None' else self.ui.p2_in_compression.currentText(),
             fp_input_root_dir=self.ui.p2_in_fp_input_root_dir.text(),
-            qt_progress_signal=self.__progress_bar.Signals.progress
+            qt_progress_signal=self.__progress_bar.Signals.progress,
+            qt_progress_label_signal=self.__progress_bar.Signals.progress_label,
         )
 
     @property
@@ -1,4 +1,3 @@
-import copy
 import logging
 import os
 import threading
@@ -12,7 +11,11 @@ try:
 except ModuleNotFoundError:
     safir_batch_run = None
 
-from fsetoolsGUI.etc.safir_post_processor import out2pstrain, pstrain2dict, save_csv, make_strain_lines_for_given_shell
+from fsetoolsGUI.etc.safir_bc import REDUCTION_NAME, make_reduction_template, write_batch_bc
+from fsetoolsGUI.etc.safir_extractor import complete_size, is_compressed
+from fsetoolsGUI.etc.safir_post_processor import (
+    StrainTail, align_series, load_strain, load_strain_index, save_csv, make_strain_lines_for_given_shell
+)
 from fsetoolsGUI.gui.layout.i0630_safir_postprocessor import Ui_MainWindow
 from fsetoolsGUI.gui.logic.c0000_app_template_old import AppBaseClass
 from fsetoolsGUI.gui.logic.custom_plot import App as PlotApp
@@ -24,6 +27,7 @@ logger = logging.getLogger('gui')
 class Signals(QtCore.QObject):
     __process_safir_out_file_complete = QtCore.Signal(bool)
     __progress = QtCore.Signal(int)
+    __follow_out_file_updated = QtCore.Signal(int)
 
     @property
     def process_safir_out_file_complete(self) -> QtCore.Signal:
@@ -33,6 +37,10 @@ class Signals(QtCore.QObject):
     def progress(self) -> QtCore.Signal:
         return self.__progress
 
+    @property
+    def follow_out_file_updated(self) -> QtCore.Signal:
+        return self.__follow_out_file_updated
+
 
 class ProgressBar(QtWidgets.QDialog):
     def __init__(self, title: str = None, initial_value: int = 0, parent=None):
@@ -71,11 +79,14 @@ class App(AppBaseClass):
         super().__init__(parent=parent)
 
         self.__dict_out = None
+        self.__strain_index = None
+        self.__strain_tail = None
+        self.__strain_tail_thread = None
         self.__Table = None
         self.__Figure = None
         self.__Figure_ax = None
         self.__fp_out = None
-        self.__fp_out_processed = None
+        self.__fp_out_size = None
         self.__fp_out_strain_csv = None
         self.__strain_lines = None
         self.__Signals = Signals()
@@ -94,6 +105,7 @@ class App(AppBaseClass):
         self.init_batch_run()
         self.init_batch_bc()
         self.init_post_process_strain()
+        self.init_follow_out_file()
 
     def init_post_process_strain(self):
         self.ui.lineEdit_in_fp_out.setReadOnly(True)
@@ -102,6 +114,90 @@ class App(AppBaseClass):
         self.ui.pushButton_fp_out.clicked.connect(self.__upon_output_file_selection_step_1)
         self.ui.comboBox_in_shell.currentIndexChanged.connect(self.__upon_shell_combobox_change)
 
+    def init_follow_out_file(self):
+        """Follow mode, poll the selected *.out file while Safir is still writing it and refresh the selected shell."""
+        self.ui.checkBox_follow_out_file = QtWidgets.QCheckBox('Follow *.out')
+        self.ui.checkBox_follow_out_file.setToolTip('Parse strain data appended to the *.out file every 5 seconds')
+        self.statusBar().addPermanentWidget(self.ui.checkBox_follow_out_file)
+
+        self.__strain_tail_timer = QtCore.QTimer(self)
+        self.__strain_tail_timer.setInterval(5000)
+
+        self.__strain_tail_timer.timeout.connect(self.__follow_out_file_poll)
+        self.ui.checkBox_follow_out_file.stateChanged.connect(self.__follow_out_file_toggled)
+        self.__Signals.follow_out_file_updated.connect(self.__follow_out_file_refresh)
+
+    def __follow_out_file_toggled(self):
+        if not self.ui.checkBox_follow_out_file.isChecked():
+            # the tail is kept, following again resumes from where it stopped
+            self.__strain_tail_timer.stop()
+            return
+
+        if not self.__fp_out:
+            self.statusBar().showMessage('Select a *.out file to follow.')
+            self.ui.checkBox_follow_out_file.setChecked(False)
+            return
+
+        if self.__strain_tail is None:
+            try:
+                self.__strain_tail = StrainTail(self.__fp_out, min_interval=self.__strain_tail_timer.interval() / 1000)
+            except ValueError as e:
+                self.statusBar().showMessage(str(e))
+                self.ui.checkBox_follow_out_file.setChecked(False)
+                return
+            if isinstance(self.__dict_out, dict) and self.__fp_out_size is not None:
+                # continue from the strain data already loaded, only bytes appended since are parsed
+                self.__strain_tail.seed(self.__dict_out, self.__fp_out_size)
+        self.__follow_out_file_poll()
+        self.__strain_tail_timer.start()
+
+    def __follow_out_file_poll(self):
+        # parse in a background thread, skip this tick if the previous poll is still running
+        if self.__strain_tail_thread is not None and self.__strain_tail_thread.is_alive():
+            return
+        strain_tail = self.__strain_tail
+        if strain_tail is None:
+            return
+
+        def worker():
+            try:
+                n = strain_tail.poll()
+            except Exception as e:
+                logger.warning(f'Failed to follow *.out file, {e}')
+                return
+            if n > 0:
+                self.__Signals.follow_out_file_updated.emit(n)
+
+        self.__strain_tail_thread = threading.Thread(target=worker)
+        self.__strain_tail_thread.start()
+
+    @Slot(int)
+    def __follow_out_file_refresh(self, n: int):
+        if self.__strain_tail is None:
+            return
+
+        # the grouped index is not maintained while following, lookups fall back to masks
+        self.__dict_out = self.__strain_tail.data
+        self.__strain_index = None
+
+        list_unique_shell = [f'{i:g}' for i in np.unique(self.__dict_out['list_shell'])]
+        if self.ui.comboBox_in_shell.count() != len(list_unique_shell):
+            self.ui.comboBox_in_shell.currentIndexChanged.disconnect()
+            self.ui.comboBox_in_shell.clear()
+            self.ui.comboBox_in_shell.addItems(list_unique_shell)
+            if self.ui.lineEdit_in_shell.text() in list_unique_shell:
+                self.ui.comboBox_in_shell.setCurrentText(self.ui.lineEdit_in_shell.text())
+            self.ui.comboBox_in_shell.currentIndexChanged.connect(self.__upon_shell_combobox_change)
+            self.ui.comboBox_in_shell.setEnabled(True)
+            self.ui.lineEdit_in_shell.setEnabled(True)
+            self.ui.pushButton_ok.setEnabled(True)
+
+        if self.ui.lineEdit_in_shell.text():
+            self.post_strain_ok_slient()
+        self.statusBar().showMessage(
+            f'Following *.out, {n:d} new records, TIME = {self.__strain_tail.time_current:g}'
+        )
+
     def init_batch_run(self):
 
         def select_safir_exe_path():
@@ -177,20 +273,7 @@ class App(AppBaseClass):
             if fp:
                 fp = path.realpath(fp)
                 self.ui.lineEdit_batchbc_root_dir.setText(fp)
-
-                list_fp = list()
-                for root, dirs, files in os.walk(fp):
-                    for file_ in files:
-                        if file_.endswith('.in'):
-                            relative_path = path.realpath(root).lstrip(fp)
-                            # relative_path.lstrip(fp)
-                            print(relative_path, fp)
-                            list_fp.append(relative_path)
-                list_fp = list(set(list_fp))
-                list_fp = ['rel_dir,val'] + [f'{i},{j}' for i, j in zip(list_fp, [1] * len(list_fp))]
-
-                with open(path.join(fp, 'bc_reduction_template.csv'), 'w+') as f:
-                    f.write('\n'.join(list_fp))
+                make_reduction_template(fp)
 
         def select_bc_file():
             fp, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Select bc file')
@@ -202,36 +285,25 @@ class App(AppBaseClass):
             fp_bc = self.ui.lineEdit_batchbc_bc_file.text()
             is_apply_reduction_factor = self.ui.checkBox_batchbc_reduction_factor.isChecked()
 
-            bc = np.genfromtxt(fp_bc, delimiter=',')
-
-            list_dir = list()
-            for root, dirs, files in os.walk(dir_work):
-                for file_ in files:
-                    if file_.endswith('.in'):
-                        list_dir.append(path.realpath(root))
-
-            dict_reduction = dict()
-            if is_apply_reduction_factor:
-                for i, j in np.recfromcsv(path.join(dir_work, 'bc_reduction.csv'), autostrip=True, dtype=None):
-                    k = i.decode('utf-8')
-                    dict_reduction[k] = j
-
-            for dir in list_dir:
-                if dict_reduction:
-                    k = dir.lstrip(dir_work)
-                    print(k, list(dict_reduction.keys()))
-                    reduction_value = dict_reduction[k]
-                    bc_ = copy.copy(bc)
-                    bc_[:, 1] = bc_[:, 1] * reduction_value
-                else:
-                    bc_ = bc
-                np.savetxt(path.join(dir, path.basename(fp_bc)), bc_, delimiter=',', fmt='%g')
+            try:
+                result = write_batch_bc(
+                    dir_work, fp_bc, path.join(dir_work, REDUCTION_NAME) if is_apply_reduction_factor else None
+                )
+            except (OSError, ValueError) as e:
+                self.statusBar().showMessage(f'Failed to write boundary condition files, {e}')
+                logger.error(f'Failed to write boundary condition files, {e}')
+                return
+            self.statusBar().showMessage(
+                f'{len(result["written"])} boundary condition files written, {len(result["unchanged"])} unchanged'
+            )
 
         self.ui.pushButton_batchbc_root_dir.clicked.connect(select_root_dir)
         self.ui.pushButton_batchbc_bc_file.clicked.connect(select_bc_file)
         self.ui.pushButton_batchbc_ok.clicked.connect(run)
 
     def __upon_output_file_selection_step_1(self):
+        self.ui.checkBox_follow_out_file.setChecked(False)
+        self.__strain_tail = None
         self.statusBar().showMessage('Processing *.out file ...')
         self.ui.lineEdit_in_shell.setDisabled(True)
         self.ui.comboBox_in_shell.setDisabled(True)
@@ -253,11 +325,10 @@ class App(AppBaseClass):
             self.ui.lineEdit_in_fp_out.setText(fp)
             self.__fp_out = fp
             self.__fp_out_strain_csv = path.join(path.dirname(fp), path.basename(fp) + '.strain.csv')
-            self.__fp_out_processed = path.join(path.dirname(fp), path.basename(fp) + '.p')
 
-        # -----------------------------------------------------------
-        # convert *.out to *.out.p, *.out.p contains only strain data
-        # -----------------------------------------------------------
+        # ---------------------------------------
+        # extract strain data from *.out in thread
+        # ---------------------------------------
         t = threading.Thread(target=self.__upon_output_file_selection_step_2)
         t.start()
 
@@ -268,38 +339,41 @@ class App(AppBaseClass):
     def __upon_output_file_selection_step_2(self):
         """Upon output file selection, step 2, analysis the `*.out` file (i.e. `fp_out`)."""
         fp_out = self.__fp_out
-        fp_out_processed = self.__fp_out_processed
         fp_out_strain_csv = self.__fp_out_strain_csv
 
-        # -----------------------------------------------------------
-        # convert *.out to *.out.p, *.out.p contains only strain data
-        # -----------------------------------------------------------
+        # ---------------------------------------------------------------
+        # extract strain data from *.out, or load it from existing cache
+        # ---------------------------------------------------------------
+        # dict format {'list_shell': [...], 'list_surf': [...], 'list_rebar': [...], ...}
         try:
-            out2pstrain(fp_out, fp_out_processed)
+            # complete lines only, so that follow mode can continue from here while Safir is still writing
+            size = None if is_compressed(fp_out) else complete_size(fp_out)
+            dict_out = load_strain(fp_out, n_proc=0, size=size)
         except Exception as e:
-            self.__dict_out = ValueError(f'Failed to convert `*.out` to `*.out.p`. {e}')
+            self.__dict_out = ValueError(f'Failed to extract strain data from `*.out`. {e}')
             self.__Signals.process_safir_out_file_complete.emit(True)
             return
 
-        # --------------------------------------
-        # convert *.out.p to data in dict format
-        # --------------------------------------
-        # dict format {'list_shell': [...], 'list_surf': [...], 'list_rebar': [...], ...}
+        # grouped index by (shell, surf, rebar) for fast shell lookups
         try:
-            dict_out = pstrain2dict(fp_out_processed)
+            strain_index = load_strain_index(fp_out, dict_out)
         except Exception as e:
-            self.__dict_out = ValueError(f'Failed to convert `*.out.p` to dict. {e}')
+            self.__dict_out = ValueError(f'Failed to make strain index. {e}')
             self.__Signals.process_safir_out_file_complete.emit(True)
             return
 
+        # only (re)write *.csv when it is out of date
         try:
-            save_csv(fp_out_strain_csv, **dict_out)
+            if not (path.isfile(fp_out_strain_csv) and path.getmtime(fp_out_strain_csv) >= path.getmtime(fp_out)):
+                save_csv(fp_out_strain_csv, **dict_out)
         except Exception as e:
             self.__dict_out = ValueError(f'Failed to save strain data as *.csv. {e}')
             self.__Signals.process_safir_out_file_complete.emit(True)
             return
 
         self.__dict_out = dict_out
+        self.__fp_out_size = size
+        self.__strain_index = strain_index
 
         self.__Signals.process_safir_out_file_complete.emit(True)
 
@@ -310,9 +384,7 @@ class App(AppBaseClass):
                 self.statusBar().showMessage(f'{self.__dict_out}')
                 return
 
-            list_unique_shell = list(set(self.__dict_out['list_shell']))
-            list_unique_shell.sort()
-            list_unique_shell = [f'{i:g}' for i in list_unique_shell]
+            list_unique_shell = [f'{i:g}' for i in self.__strain_index['unique_shell']]
 
             self.ui.comboBox_in_shell.setEnabled(True)
             self.ui.lineEdit_in_shell.setEnabled(True)
@@ -341,14 +413,22 @@ class App(AppBaseClass):
             return ValueError(f'Failed to parse inputs {e}')
 
         # Check if user defined `unique_shell` exists
-        if not input_parameters['unique_shell'] in self.__dict_out['list_shell']:
+        if self.__strain_index is None:
+            is_shell_found = np.any(self.__dict_out['list_shell'] == input_parameters['unique_shell'])
+        else:
+            unique_shell = self.__strain_index['unique_shell']
+            i = np.searchsorted(unique_shell, input_parameters['unique_shell'])
+            is_shell_found = i < len(unique_shell) and unique_shell[i] == input_parameters['unique_shell']
+        if not is_shell_found:
             return ValueError(f'Shell index not found.')
 
         # -------------------------------------------------------
         # Make strain evaluation data for selected `unique_shell`
         # -------------------------------------------------------
         try:
-            self.__strain_lines = make_strain_lines_for_given_shell(input_parameters['unique_shell'], **self.__dict_out)
+            self.__strain_lines = make_strain_lines_for_given_shell(
+                input_parameters['unique_shell'], **self.__dict_out, index=self.__strain_index
+            )
         except Exception as e:
             return ValueError(f'Failed to make strain lines {e}')
 
@@ -377,7 +457,7 @@ class App(AppBaseClass):
         self.__strain_lines = make_strain_lines_for_given_shell(**kwargs)
 
     def select_file_path(self, title: str = "Select file", default_dir: str = "~/",
-                         file_type: str = "Safir output file (*.out *.OUT *.txt)"):
+                         file_type: str = "Safir output file (*.out *.OUT *.txt *.out.gz *.out.zst)"):
         """select input file and copy its path to ui object"""
 
         # dialog to select file
@@ -390,33 +470,12 @@ class App(AppBaseClass):
 
         # output_parameters = self.output_parameters
 
-        list_x = [list(i['x']) for i in self.__strain_lines]
-        list_y = [i['y'] for i in self.__strain_lines]
         list_label = [i['label'] for i in self.__strain_lines]
 
-        # make a full x values
-        x_all = []
-        for i in self.__strain_lines:
-            x_all += list(i['x'])
-        x_all = list(set(x_all))
-        x_all.sort()
-
-        # fill y values to match len(x_all)
-        for i in range(len(list_x)):
-            x = list_x[i]
-            y = list_y[i]
-            y_ = [0] * len(x_all)
-            for j, v in enumerate(x_all):
-                try:
-                    y_[j] = y[x.index(v)]
-                except ValueError:
-                    pass
-            list_y[i] = y_
-            print(len(y_))
-
-        list_content = [x_all]
-        [list_content.append(i) for i in list_y]
-        list_content = [[float(j) for j in i] for i in zip(*list_content)]
+        # align all lines onto the union of their time stamps, missing values are shown as 0
+        list_content = align_series(
+            [i['x'] for i in self.__strain_lines], [i['y'] for i in self.__strain_lines], fill=0
+        ).tolist()
 
         # print results (for console enabled version only)
 